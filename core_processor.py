@@ -2,6 +2,7 @@ import os
 import time
 import shutil
 import threading
+import contextvars
 import zipfile
 import re
 
@@ -15,6 +16,22 @@ from translation_evaluator import evaluate_translations
 from video_processor import burn_subtitles
 from validator import validate_vtt_structure
 
+# Cue end timestamp ("--> 00:00:05.000"), compiled once at import
+_CUE_END_TS = re.compile(r"--> (\d{2}:\d{2}:\d{2}\.\d{3})")
+
+def last_cue_end(vtt_content):
+    """
+    Returns the last cue end timestamp string of a VTT (None if there is none).
+    Scans backwards from the end instead of collecting every timestamp.
+    """
+    pos = vtt_content.rfind("--> ")
+    while pos != -1:
+        match = _CUE_END_TS.match(vtt_content, pos)
+        if match:
+            return match.group(1)
+        pos = vtt_content.rfind("--> ", 0, pos)
+    return None
+
 def is_vertical_video(video_path):
     try:
         import subprocess
@@ -66,9 +83,8 @@ def process_video(
     """
     
     # Initialize Tracking
-    # Note: In a stateless cloud function, global reset might be risky if handling concurrent reqs in same process,
-    # but for Cloud Run Jobs (one execution per container usually) or single-threaded local, it's fine.
-    # ideally utils.cost_session should be a class or context manager, but keeping as is for minimal refactor.
+    # The session cost lives in a ContextVar: concurrent jobs in one process (threads / async tasks)
+    # each get their own counter, and resetting here doesn't zero other jobs' totals.
     reset_session_cost() 
     job_start_time = time.time()
     
@@ -79,7 +95,7 @@ def process_video(
 
     try:
         # --- 2. EXTRACT AUDIO ---
-        audio_filename = f"temp_audio_{video_filename}.mp3"
+        audio_filename = f"temp_audio_{video_filename}.wav"
         audio_path = extract_audio(video_path, audio_filename)
         if not audio_path:
             raise Exception("Audio extraction failed.")
@@ -93,9 +109,8 @@ def process_video(
         # CALCULATE Speech2Text COST
         audio_duration = 0
         try:
-            timestamps = re.findall(r"--> (\d{2}:\d{2}:\d{2}\.\d{3})", vtt_content)
-            if timestamps:
-                last_timestamp = timestamps[-1]
+            last_timestamp = last_cue_end(vtt_content)
+            if last_timestamp:
                 seconds = parse_vtt_time(last_timestamp)
                 audio_duration = seconds
                 log_whisper_cost(seconds)
@@ -127,9 +142,10 @@ def process_video(
         # We start it here. It relies on files or data. 
         # Note: In a Cloud Run Job, we might want to wait for this? 
         # But for now, we keep the detached thread behavior if it just logs.
+        # Runs in a copy of this job's context, so its usage counts towards this job's session cost
         eval_thread = threading.Thread(
-            target=evaluate_translations,
-            args=(full_english_text, full_target_text1, full_target_text, target_language)
+            target=contextvars.copy_context().run,
+            args=(evaluate_translations, full_english_text, full_target_text1, full_target_text, target_language)
         )
         eval_thread.start()
 
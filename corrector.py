@@ -1,7 +1,7 @@
 import json
 import time
 
-from utils import log_openai_usage, get_model_name
+from utils import log_openai_usage, get_model_name, response_to_dict
 
 def get_topic(text, client, model="gpt-5-nano"):
     """
@@ -35,7 +35,7 @@ def get_corrections(utterances, topic, client, model="gpt-5-nano"):
     """
     Step 2: Find corrections based on topic.
     Receives list of Utterance objects (dicts).
-    Returns: List of dicts { "utterance_id": int, "original": "...", "replacement": "..." }
+    Returns: List of dicts { "utterance_id": int, "original": "...", "replacement": "..." }, or None if the check failed.
     """
     print("   🧐 Checking for mistranscriptions...")
     
@@ -85,7 +85,7 @@ def get_corrections(utterances, topic, client, model="gpt-5-nano"):
     
     except Exception as e:
         print(f"   ⚠️ Correction check failed: {e}")
-        return []
+        return None
 
 def patch_response(response_dict, corrections):
     """
@@ -149,18 +149,12 @@ def patch_response(response_dict, corrections):
 def apply_corrections(deepgram_response, client):
     """
     Orchestrator function.
+    Returns: (response, transcript_text, corrected). corrected is False if the correction could not run
+    (the response and text are then uncorrected, and the text may be empty).
     """
     try:
         # 0. Convert to dict first to avoid Pydantic frozen errors
-        if hasattr(deepgram_response, "to_dict"):
-            response_dict = deepgram_response.to_dict()
-        elif hasattr(deepgram_response, "model_dump"):
-            response_dict = deepgram_response.model_dump()
-        elif isinstance(deepgram_response, dict):
-            response_dict = deepgram_response
-        else:
-             # Fallback using json serialization provided by the object usually
-             response_dict = json.loads(deepgram_response.to_json())
+        response_dict = response_to_dict(deepgram_response)
 
         # 1. Extract essentials
         try:
@@ -170,17 +164,19 @@ def apply_corrections(deepgram_response, client):
             original_text = response_dict["results"]["channels"][0]["alternatives"][0]["transcript"]
         except KeyError:
             print("   ⚠️ 'utterances' not found in response. Skipping correction.")
-            return deepgram_response, ""
+            return deepgram_response, "", False
         
         # 2. Get Topic (uses global text)
         topic = get_topic(original_text, client)
         
         # 3. Get Corrections (uses utterances)
         corrections = get_corrections(utterances, topic, client)
+        if corrections is None:
+            return response_dict, original_text, False
         
         if not corrections:
             print("   ✅ No corrections suggested.")
-            return response_dict, original_text
+            return response_dict, original_text, True
         
         print(f"   📋 Found {len(corrections)} suggested corrections.")
         for c in corrections:
@@ -189,11 +185,11 @@ def apply_corrections(deepgram_response, client):
         # 4. Patch Response
         patched_response_dict, patched_text = patch_response(response_dict, corrections)
         
-        return patched_response_dict, patched_text
+        return patched_response_dict, patched_text, True
 
     except Exception as e:
         print(f"   ⚠️ Correction process failed: {e}")
         # Return original if anything fails
         # If we failed before dict conversion, we return the object, which transcriber handles.
         # If we failed after, we return dict.
-        return deepgram_response, ""
+        return deepgram_response, "", False
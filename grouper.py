@@ -1,5 +1,8 @@
 import re
 
+# Whole-cue regex: 00:00:00.000 --> 00:00:05.000 + text up to the blank line (compiled once at import)
+_VTT_CUE_RE = re.compile(r'(\d{2}:\d{2}:\d{2}\.\d{3})\s-->\s(\d{2}:\d{2}:\d{2}\.\d{3})\n(.*?)(?=\n\n|\Z)', re.DOTALL)
+
 def parse_vtt_time(timestamp):
     parts = timestamp.replace(',', '.').split(':')
     if len(parts) == 3:
@@ -132,11 +135,10 @@ def read_vtt(file_path):
         content = f.read()
 
     # 2. Parse Whisper Blocks (Time-based)
-    pattern = re.compile(r'(\d{2}:\d{2}:\d{2}\.\d{3})\s-->\s(\d{2}:\d{2}:\d{2}\.\d{3})\n(.*?)(?=\n\n|\Z)', re.DOTALL)
-    matches = pattern.findall(content)
-
+    # finditer: no intermediate list of match tuples (the VTT is generated by transcriber, so it's well-formed)
     raw_cues = []
-    for i, (start, end, text) in enumerate(matches):
+    for i, match in enumerate(_VTT_CUE_RE.finditer(content)):
+        start, end, text = match.groups()
         raw_cues.append({
             "id": i,
             "start": start,
@@ -1,6 +1,11 @@
+import os
 import json
 import time
 import difflib
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from openai import OpenAI
 from dotenv import load_dotenv
 from utils import log_openai_usage, get_llm_client, get_model_name
@@ -8,10 +13,32 @@ from utils import log_openai_usage, get_llm_client, get_model_name
 load_dotenv()
 client = get_llm_client()
 
+# Hedged matcher requests: a second request is fired if the first hasn't answered after the hedge delay,
+# the p95 of recent matcher latencies (so only the slowest ~5% of calls pay for a second request).
+# Set MATCHER_HEDGE_DELAY (seconds) to use a fixed delay instead.
+HEDGE_DELAY_OVERRIDE = os.getenv("MATCHER_HEDGE_DELAY")
+HEDGE_DEFAULT_DELAY = 15.0  # Until HEDGE_MIN_SAMPLES latencies have been measured
+HEDGE_MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 0.95
+HEDGE_FANOUT = 2  # Max requests in flight per match (caps wasted spend)
+# A losing request can't be aborted once sent: this timeout (not the client's 600 s) bounds how long it runs on
+MATCHER_REQUEST_TIMEOUT = float(os.getenv("MATCHER_REQUEST_TIMEOUT", "60"))
+_latencies = deque(maxlen=200)  # Seconds per completed matcher request, most recent last
+_latencies_lock = threading.Lock()
+
+def _hedge_delay():
+    if HEDGE_DELAY_OVERRIDE:
+        return float(HEDGE_DELAY_OVERRIDE)
+    with _latencies_lock:
+        samples = sorted(_latencies)
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return samples[min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE))]
+
 def find_matching_translation(original_language_block_text, target_language_search_window, context_preview="", next_block_text=""):
     """
     Finds the exact target language substring corresponding to the original language text.
-    Retries automatically if the AI returns an empty result.
+    Hedges slow requests and retries automatically if the AI returns an empty or invalid result.
     
     Args:
         original_language_block_text: The source text block.
@@ -22,6 +49,8 @@ def find_matching_translation(original_language_block_text, target_language_sear
     
     # 1. THE ROBUST PROMPT
     # We explicitly tell the AI about the "Sliding Window" artifacts (broken words).
+    # The examples are static on purpose: the whole system prompt is identical on every call, so it is served
+    # from the prompt cache. Keep anything call-specific in user_prompt.
     system_prompt = """
     You are a Translation Matcher.
     INPUT: An original language text segment, a target language search window, and previous context.
@@ -39,6 +68,52 @@ def find_matching_translation(original_language_block_text, target_language_sear
     7. EXACT EXTRACT: Extract the substring EXACTLY as it appears in the target language text. Do NOT add closing quotes or punctuation that is not present in the window at that exact position.
     8. ALREADY TRANSLATED: FIRST, always try to find the translation in the SEARCH WINDOW. If the translation exists anywhere in the SEARCH WINDOW, return it normally and set `already_translated_in_context` to false (e.g. if the original is "Why? Why?" and the target has "Почему? Почему?", match the individual "Почему?"). ONLY IF you absolutely CANNOT find the translation in the search window, AND you clearly see that the source text's translation was completely merged into the PREVIOUS CONTEXT block (for example, a repeated word that was translated only once), then you may set `already_translated_in_context` to true and leave `target_language_substring` empty.
     9. JSON OUTPUT: { "target_language_substring": "...", "already_translated_in_context": false }
+
+    EXAMPLES:
+
+    Example 1 - Partial match, stop before the next segment:
+      ORIGINAL LANGUAGE SEGMENT: "So I went to the store"
+      NEXT SOURCE SEGMENT: "and bought some milk."
+      TARGET LANGUAGE SEARCH WINDOW: "Então fui à loja e comprei leite. Depois voltei para casa."
+      OUTPUT: { "target_language_substring": "Então fui à loja", "already_translated_in_context": false }
+
+    Example 2 - Short next segment must be excluded:
+      ORIGINAL LANGUAGE SEGMENT: "It's a great idea,"
+      NEXT SOURCE SEGMENT: "right?"
+      TARGET LANGUAGE SEARCH WINDOW: "Es una gran idea, ¿no? Vamos a probarla mañana."
+      OUTPUT: { "target_language_substring": "Es una gran idea,", "already_translated_in_context": false }
+
+    Example 3 - Fragment at the very start of the window must be matched:
+      CONTEXT: "...e foi isso que aconteceu com o"
+      ORIGINAL LANGUAGE SEGMENT: "project."
+      NEXT SOURCE SEGMENT: "Then we started again."
+      TARGET LANGUAGE SEARCH WINDOW: "projeto. Depois começamos de novo."
+      OUTPUT: { "target_language_substring": "projeto.", "already_translated_in_context": false }
+
+    Example 4 - Break a quote that spans several sentences:
+      ORIGINAL LANGUAGE SEGMENT: "He said, \"I will come."
+      NEXT SOURCE SEGMENT: "Wait for me.\""
+      TARGET LANGUAGE SEARCH WINDOW: "Ele disse: \"Eu vou. Espere por mim.\" E saiu."
+      OUTPUT: { "target_language_substring": "Ele disse: \"Eu vou.", "already_translated_in_context": false }
+
+    Example 5 - Repeated text in the search window, match only one occurrence:
+      ORIGINAL LANGUAGE SEGMENT: "Why?"
+      NEXT SOURCE SEGMENT: "Why?"
+      TARGET LANGUAGE SEARCH WINDOW: "Почему? Почему? Я не понимаю."
+      OUTPUT: { "target_language_substring": "Почему?", "already_translated_in_context": false }
+
+    Example 6 - Repeated word merged into the previous context (ONLY when it is absent from the window):
+      CONTEXT: "...Não, não, não."
+      ORIGINAL LANGUAGE SEGMENT: "No."
+      NEXT SOURCE SEGMENT: "Let's go home."
+      TARGET LANGUAGE SEARCH WINDOW: "Vamos para casa."
+      OUTPUT: { "target_language_substring": "", "already_translated_in_context": true }
+
+    Example 7 - Exact extraction, no added punctuation:
+      ORIGINAL LANGUAGE SEGMENT: "we need to talk about the budget"
+      NEXT SOURCE SEGMENT: "before Friday."
+      TARGET LANGUAGE SEARCH WINDOW: "precisamos falar sobre o orçamento antes de sexta-feira."
+      OUTPUT: { "target_language_substring": "precisamos falar sobre o orçamento", "already_translated_in_context": false }
     """
 
     user_prompt = f"""
@@ -58,84 +133,115 @@ def find_matching_translation(original_language_block_text, target_language_sear
     current_model = get_model_name("gpt-5.2")
     max_retries = 3
 
-    for attempt in range(max_retries):
-        
-        # --- TRACE START ---
-        start_time = time.perf_counter()
-
-        try:
-            # print(f"   >>> [DEBUG MATCHER] Attempt {attempt+1}/{max_retries}")
-            
-            response = client.chat.completions.create(
-                model=current_model,
-                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-                response_format={"type": "json_object"}
-            )
-            
-            # --- TRACE LOG ---
-            log_openai_usage(f"MATCHER-Try{attempt+1}", start_time, response)
-
-            content = response.choices[0].message.content
-            if not content:
-                raise ValueError("Empty response from API")
-                
-            result_json = json.loads(content)
-            
-            # NLP Fix for Omitted Repeated Translations
-            if result_json.get("already_translated_in_context", False):
-                # print("   💡 NLP Matcher detected text was already translated in context.")
-                return "<ALREADY_TRANSLATED>"
-                
-            matched_text = result_json.get("target_language_substring", "")
-            if matched_text:
-                matched_text = matched_text.replace('\x00', '')
-
-            # RETRY LOGIC: If AI returns empty string, try again.
-            if not matched_text.strip():
-                debug_trap = True
-                if attempt < max_retries - 1:
-                    print(f"   ⚠️ Matcher returned empty string. Retrying... ({attempt+1}/{max_retries})")
-                    continue # Try again
-                else:
-                     print(f"   ❌ Matcher failed to find text after {max_retries} attempts.")
-                     return ""
-
-            # --- PROGRAMMATIC VERIFICATION ---
-            # If the specific text isn't found in the window, it might be a hallucination (e.g. added quote).
-            if matched_text and matched_text != "<ALREADY_TRANSLATED>" and matched_text not in target_language_search_window:
-                # Try stripping trailing quotes/punctuation
-                stripped = matched_text.strip('"').strip("'").strip()
-                if stripped and stripped in target_language_search_window:
-                    # print(f"   🔧 Fixed hallucinated quotes: '{matched_text}' -> '{stripped}'")
-                    matched_text = stripped
-                else:
-                    # Try stripping just the last character (common for single hallucinated punct like " or .)
-                    if matched_text and matched_text[:-1] in target_language_search_window:
-                         matched_text = matched_text[:-1]
-                    else:
-                         # --- FUZZY FALLBACK ---
-                         fuzzy_match = fuzzy_find_substring(matched_text, target_language_search_window)
-                         if fuzzy_match:
-                             # print(f"   🪄 Fuzzy Match Recovered: '{matched_text}' -> '{fuzzy_match}'")
-                             matched_text = fuzzy_match
-                         else:
-                             print(f"   ⚠️ Programmatic Verification Failed: '{matched_text}' not in search window.")
-                             raise ValueError(f"Hallucinated match: {matched_text}")
-
-            # --- HEURISTIC WATCHDOG (NEW) ---
-            # Protection against "Colon Merges" or "Run-on Matches"
-            matched_text = heuristic_trim_match(original_language_block_text, matched_text)
-
-            return matched_text
-
-        except Exception as e:
-            print(f"   ⚠️ Matcher Error (Attempt {attempt+1}): {e}")
-            if attempt == max_retries - 1:
-                return ""
-            time.sleep(1) # Small pause before retry
+    # --- HEDGED REQUESTS ---
+    # Fire the first attempt; if it hasn't answered after the hedge delay, fire a second one in parallel
+    # and take whichever returns a VALID result first. Failed attempts are replaced the same way,
+    # so at most HEDGE_FANOUT requests are in flight and at most max_retries are sent in total.
+    # One executor per call: losers finishing in the background never delay another call (or its hedge timer).
+    executor = ThreadPoolExecutor(max_workers=HEDGE_FANOUT, thread_name_prefix="matcher")
+
+    def launch(attempt):
+        # Run in a copy of the caller's context so usage is billed to the caller's session cost
+        return executor.submit(
+            contextvars.copy_context().run, _request_match, attempt, current_model, system_prompt, user_prompt,
+            original_language_block_text, target_language_search_window
+        )
+
+    hedge_delay = _hedge_delay()
+    attempts_started = 1
+    try:
+        pending = {launch(1)}
 
+        while pending:
+            can_hedge = attempts_started < max_retries and len(pending) < HEDGE_FANOUT
+            done, pending = wait(pending, timeout=hedge_delay if can_hedge else None, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                try:
+                    matched_text = future.result()
+                except Exception as e:
+                    print(f"   ⚠️ Matcher Error: {e}")
+                    continue
+                return matched_text
+
+            # Nothing valid yet (slow or failed): hedge / replace if the budget allows
+            if attempts_started < max_retries and len(pending) < HEDGE_FANOUT:
+                attempts_started += 1
+                if done:
+                    print(f"   ⚠️ Retrying matcher... ({attempts_started}/{max_retries})")
+                pending.add(launch(attempts_started))
+    finally:
+        # Don't wait for the losers: requests already running finish in the background (within MATCHER_REQUEST_TIMEOUT)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    print(f"   ❌ Matcher failed to find text after {max_retries} attempts.")
     return ""
 
+def _request_match(attempt, model, system_prompt, user_prompt, original_language_block_text, target_language_search_window):
+    """
+    Single matcher request. Returns the verified match (or "<ALREADY_TRANSLATED>").
+    Raises on empty/invalid results so the caller can hedge or retry.
+    """
+    # --- TRACE START ---
+    start_time = time.perf_counter()
+
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+        response_format={"type": "json_object"},
+        timeout=MATCHER_REQUEST_TIMEOUT
+    )
+    
+    # --- TRACE LOG ---
+    log_openai_usage(f"MATCHER-Try{attempt}", start_time, response)
+    with _latencies_lock:
+        _latencies.append(time.perf_counter() - start_time)
+
+    content = response.choices[0].message.content
+    if not content:
+        raise ValueError(f"Empty response from API (Attempt {attempt})")
+        
+    result_json = json.loads(content)
+    
+    # NLP Fix for Omitted Repeated Translations
+    if result_json.get("already_translated_in_context", False):
+        # print("   💡 NLP Matcher detected text was already translated in context.")
+        return "<ALREADY_TRANSLATED>"
+        
+    matched_text = result_json.get("target_language_substring", "")
+    if matched_text:
+        matched_text = matched_text.replace('\x00', '')
+
+    # RETRY LOGIC: If AI returns empty string, try again.
+    if not matched_text.strip():
+        raise ValueError(f"Matcher returned empty string (Attempt {attempt})")
+
+    # --- PROGRAMMATIC VERIFICATION ---
+    # If the specific text isn't found in the window, it might be a hallucination (e.g. added quote).
+    if matched_text not in target_language_search_window:
+        # Try stripping trailing quotes/punctuation
+        stripped = matched_text.strip('"').strip("'").strip()
+        if stripped and stripped in target_language_search_window:
+            # print(f"   🔧 Fixed hallucinated quotes: '{matched_text}' -> '{stripped}'")
+            matched_text = stripped
+        else:
+            # Try stripping just the last character (common for single hallucinated punct like " or .)
+            if matched_text[:-1] in target_language_search_window:
+                 matched_text = matched_text[:-1]
+            else:
+                 # --- FUZZY FALLBACK ---
+                 fuzzy_match = fuzzy_find_substring(matched_text, target_language_search_window)
+                 if fuzzy_match:
+                     # print(f"   🪄 Fuzzy Match Recovered: '{matched_text}' -> '{fuzzy_match}'")
+                     matched_text = fuzzy_match
+                 else:
+                     print(f"   ⚠️ Programmatic Verification Failed: '{matched_text}' not in search window.")
+                     raise ValueError(f"Hallucinated match: {matched_text} (Attempt {attempt})")
+
+    # --- HEURISTIC WATCHDOG (NEW) ---
+    # Protection against "Colon Merges" or "Run-on Matches"
+    return heuristic_trim_match(original_language_block_text, matched_text)
+
 def heuristic_trim_match(source_text, match_text):
     """
     Safeguard: If the match is suspiciously long (> 2x source) and contains splitters (like : or .),
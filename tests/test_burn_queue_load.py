@@ -0,0 +1,56 @@
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import video_processor
+
+CPUS = os.cpu_count() or 1
+
+async def refills(queue, load):
+    """
+    With one of the queue's two processes still running and the load average at load, is the other
+    slot taken again within a second?
+    """
+    os.getloadavg = lambda: (load, load, load)
+    async with queue._slot():
+        slot = queue._slot()
+        try:
+            await asyncio.wait_for(slot.__aenter__(), timeout=1)
+        except TimeoutError:
+            return False
+        await slot.__aexit__(None, None, None)
+    return True
+
+async def run():
+    video_processor.LOAD_POLL_SECONDS = 0.05
+    queue = video_processor.BurnQueue(2)
+    queue._threads = max(1, CPUS // 2)
+    # Both processes busy: the load the queue alone puts on the machine (still in the average after one exits)
+    own_load = 2 * queue._threads
+
+    failed = []
+    if not await refills(queue, own_load):
+        failed.append(f"a queue saturating the CPU by itself (load {own_load}) stopped refilling its slots")
+    if await refills(queue, own_load + CPUS * 2):
+        failed.append(f"load from other work (load {own_load + CPUS * 2}) did not hold the queue back")
+    return failed
+
+def test():
+    getloadavg = getattr(os, "getloadavg", None)
+    try:
+        failed = asyncio.run(run())
+    finally:
+        if getloadavg:
+            os.getloadavg = getloadavg
+
+    for message in failed:
+        print(f"❌ {message}")
+    if failed:
+        print(f"❌ Test Failed: {len(failed)} problem(s) with BurnQueue back-pressure.")
+    else:
+        print("✅ Test Passed: BurnQueue throttles on other load only.")
+    return not failed
+
+if __name__ == "__main__":
+    sys.exit(0 if test() else 1)
@@ -0,0 +1,37 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from video_processor import _ffmpeg_filter_escape
+
+# (value, expected -vf escaping, expected option-only escaping)
+CASES = [
+    ("/tmp/subs/plain.vtt", "/tmp/subs/plain.vtt", "/tmp/subs/plain.vtt"),
+    ("C:\\Users\\me\\sub.vtt", "C\\\\:\\\\\\\\Users\\\\\\\\me\\\\\\\\sub.vtt", "C\\:\\\\Users\\\\me\\\\sub.vtt"),
+    ("/srv/it's here/sub.vtt", "/srv/it\\\\\\'s here/sub.vtt", "/srv/it\\'s here/sub.vtt"),
+    ("/srv/a,b/[v2];c.vtt", "/srv/a\\,b/\\[v2\\]\\;c.vtt", "/srv/a,b/[v2];c.vtt"),
+    # Example from the ffmpeg filter documentation ("Notes on filtergraph escaping")
+    (
+        "this is a 'string': may contain one, or more, special characters",
+        "this is a \\\\\\'string\\\\\\'\\\\: may contain one\\, or more\\, special characters",
+        "this is a \\'string\\'\\: may contain one, or more, special characters",
+    ),
+]
+
+def test():
+    failed = 0
+    for value, expected_graph, expected_option in CASES:
+        for graph, expected in ((True, expected_graph), (False, expected_option)):
+            result = _ffmpeg_filter_escape(value, graph)
+            if result != expected:
+                failed += 1
+                print(f"❌ {value!r} (graph={graph}): got {result!r}, expected {expected!r}")
+
+    if failed:
+        print(f"❌ Test Failed: {failed} escaping mismatches.")
+    else:
+        print(f"✅ Test Passed: {len(CASES)} paths escaped correctly.")
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if test() else 1)
@@ -0,0 +1,45 @@
+import sys
+import os
+import tempfile
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import transcriber
+
+def test():
+    cache_dir = tempfile.mkdtemp(prefix="tcache_")
+    transcriber.TRANSCRIPTION_CACHE_DIR = cache_dir
+
+    # SDK responses dumped with model_dump(mode="python") keep datetimes in the metadata
+    created = datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+    response = {
+        "metadata": {"created": created, "duration": 12.5},
+        "results": {"channels": [{"alternatives": [{"transcript": "Olá mundo."}]}]},
+    }
+    transcriber._cache_store("key", "WEBVTT\n", "Olá mundo.", response)
+    cached = transcriber._cache_lookup("key")
+    leftovers = [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
+
+    failed = []
+    if not cached:
+        failed.append("entry was not stored")
+    else:
+        if cached["vtt"] != "WEBVTT\n" or cached["text"] != "Olá mundo.":
+            failed.append(f"vtt/text changed: {cached['vtt']!r}, {cached['text']!r}")
+        if cached["response"]["metadata"]["created"] != str(created):
+            failed.append(f"datetime not kept: {cached['response']['metadata']['created']!r}")
+        if cached["response"]["results"] != response["results"]:
+            failed.append("results changed")
+    if leftovers:
+        failed.append(f"temp files left behind: {leftovers}")
+
+    for message in failed:
+        print(f"❌ {message}")
+    if failed:
+        print(f"❌ Test Failed: {len(failed)} problem(s) with the transcription cache round-trip.")
+    else:
+        print("✅ Test Passed: transcription cache round-trip with datetime metadata.")
+    return not failed
+
+if __name__ == "__main__":
+    sys.exit(0 if test() else 1)
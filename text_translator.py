@@ -3,62 +3,173 @@ import re
 from openai import OpenAI
 from dotenv import load_dotenv
 from utils import log_openai_usage, get_llm_client, get_model_name
+import tm
 import time
 
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 load_dotenv()
 
-MAX_CHUNK_SIZE = 4000  # Characters (approx 1000 tokens) - Safe size for reliable translation
+MAX_CHUNK_TOKENS = 1800   # Input tokens per chunk - Safe size for reliable translation
+CHUNK_TOKEN_MARGIN = 100  # Headroom so a chunk never lands right on the limit
 CONTEXT_SIZE = 200     # Characters of overlap/context
 MODEL_NAME = get_model_name("gpt-5.2") # Global model setting
+TM_MIN_HIT_RATE = 0.8  # Above this, only the sentences missing from the translation memory are sent to the API
+
+# Sentence boundary: punctuation followed by whitespace (the whitespace is captured)
+_SENT_SPLIT = re.compile(r'(?<=[.!?])(\s+)')
+
+_encoding = None
+
+def count_tokens(text):
+    """
+    Counts tokens with tiktoken (gpt-4o encoding, close enough for gpt-5.x).
+    Falls back to the ~4 chars/token estimate if tiktoken or its encoding file is unavailable.
+    """
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is None:
+            print("   ⚠️ tiktoken not installed. Estimating tokens from character count.")
+        else:
+            try:
+                _encoding = tiktoken.encoding_for_model("gpt-4o")
+            except Exception as e:
+                print(f"   ⚠️ Could not load tiktoken encoding ({e}). Estimating tokens from character count.")
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text))
+
+def split_into_sentences(text):
+    """
+    Splits text into a list of (sentence, separator_that_followed) tuples.
+    Whitespace trailing a sentence (e.g. at the end of the text) is kept in its separator.
+    """
+    parts = _SENT_SPLIT.split(text)
+    sentences = []
+    for sentence, sep in zip(parts[0::2], parts[1::2] + [""]):
+        if sentence.strip():
+            sentences.append((sentence.strip(), sentence[len(sentence.rstrip()):] + sep))
+    return sentences
 
-def split_into_chunks(text, max_size=MAX_CHUNK_SIZE):
+def split_into_chunks(text, max_tokens=MAX_CHUNK_TOKENS):
     """
-    Splits text into chunks of roughly max_size characters, 
+    Splits text into chunks of roughly max_tokens tokens, 
     respecting sentence boundaries and preserving whitespace.
+    Returns: list of (chunk, separator_that_followed) tuples. Use join_chunks() to reassemble.
     """
+    return [(chunk, sep) for chunk, sep, _ in _pack_chunks(text, max_tokens)]
+
+def _pack_chunks(text, max_tokens=MAX_CHUNK_TOKENS):
+    # split_into_chunks() plus each chunk's token count (sum of its sentences', each encoded once)
     chunks = []
     current_chunk = ""
+    current_sep = ""
+    current_tokens = 0
     
-    # Split by sentence endings, capturing the whitespace that follows
-    # pattern: lookbehind for punctuation, then capture one or more whitespace chars
-    parts = re.split(r'(?<=[.!?])(\s+)', text)
-    
-    for part in parts:
-        if not part: continue # skip empty
+    for sentence, sep in split_into_sentences(text):
+        sentence_tokens = count_tokens(sentence)
         
-        # If adding this part stays within limit
-        if len(current_chunk) + len(part) <= max_size:
-            current_chunk += part
+        # If adding this sentence stays within budget (or the chunk is empty, e.g. a huge sentence)
+        if not current_chunk or current_tokens + sentence_tokens + CHUNK_TOKEN_MARGIN <= max_tokens:
+            current_chunk = current_chunk + current_sep + sentence if current_chunk else sentence
+            current_tokens += sentence_tokens
         else:
-            # If current chunk is full, push it
-            if current_chunk:
-                chunks.append(current_chunk)
-                current_chunk = ""
-            
-            # If the part itself is huge, we start a new chunk with it
-            current_chunk += part
+            # Current chunk is full, push it with the whitespace that followed it
+            chunks.append((current_chunk, current_sep, current_tokens))
+            current_chunk = sentence
+            current_tokens = sentence_tokens
+        current_sep = sep
             
     if current_chunk:
-        #print (f"Last chunk: {current_chunk}")
-        chunks.append(current_chunk)
+        chunks.append((current_chunk, current_sep, current_tokens))
         
     return chunks
 
+def join_chunks(chunk_meta, translated_chunks):
+    """
+    Reassembles translated chunks using the original separators from split_into_chunks(),
+    so chunk boundaries keep their original whitespace ("\n" stays "\n").
+    """
+    return "".join(t + sep for (_, sep), t in zip(chunk_meta, translated_chunks))
+
+def _call_translation_api(client, system_prompt, text, stage_name):
+    user_content = f"""
+            [SOURCE TEXT TO TRANSLATE]:
+            {text}
+        """
+
+    start_time = time.perf_counter()
+    response = client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ]
+    )
+    log_openai_usage(stage_name, start_time, response)
+
+    return response.choices[0].message.content.strip()
+
+def _translate_chunk(client, chunk, system_prompt, target_language, stage_name):
+    """
+    Translates one chunk, reusing sentences already present in the translation memory.
+    If enough sentences are cached, only the missing ones are sent to the API.
+    """
+    sentences = split_into_sentences(chunk)
+    sources = [s for s, _ in sentences]
+    cached = tm.lookup(sources, target_language)
+
+    def assemble(translations):
+        return "".join(translations[idx] + sep for idx, (_, sep) in enumerate(sentences)).strip()
+
+    if sentences and len(cached) == len(sentences):
+        print(f"      ♻️ All {len(sentences)} sentences served from translation memory.")
+        return assemble(cached)
+
+    if sentences and len(cached) / len(sentences) >= TM_MIN_HIT_RATE:
+        misses = [idx for idx in range(len(sentences)) if idx not in cached]
+        translated = _call_translation_api(client, system_prompt, " ".join(sources[idx] for idx in misses), stage_name)
+        parts = [s for s, _ in split_into_sentences(translated)]
+        if len(parts) == len(misses):
+            print(f"      ♻️ {len(cached)}/{len(sentences)} sentences served from translation memory.")
+            new_translations = dict(zip(misses, parts))
+            tm.store([(sources[idx], new_translations[idx]) for idx in misses], target_language)
+            cached.update(new_translations)
+            return assemble(cached)
+        # Sentence count mismatch: can't map back 1:1, translate the full chunk instead
+
+    translated = _call_translation_api(client, system_prompt, chunk, stage_name)
+
+    # Only feed the TM when the 1:1 sentence mapping held
+    parts = [s for s, _ in split_into_sentences(translated)]
+    if len(parts) == len(sources):
+        tm.store(list(zip(sources, parts)), target_language)
+
+    return translated
+
 def translate_full_text(full_text, target_language="Portuguese"):
     """
     Translates the full text using a 'Context-Aware' System Prompt.
     Returns: (full_translated_text, source_chunks, translated_chunks)
+             source_chunks are (chunk, separator) tuples from split_into_chunks().
     """
     print(f"\n   🌍 Translating full text to {target_language}...")
     
     # Initialize client locally to avoid crashing at import-time
     client = get_llm_client()
     
-    chunks = split_into_chunks(full_text)
+    packed = _pack_chunks(full_text)
+    chunks = [(chunk, sep) for chunk, sep, _ in packed]
     translated_chunks = []
+    translated_map = {}  # chunk text -> translation, so repeated chunks (intros, sponsor reads) hit the API once
     previous_context = ""
     
-    print(f"   ℹ️ Text split into {len(chunks)} chunks.")
+    unique_count = len({chunk for chunk, _ in chunks})
+    print(f"   ℹ️ Text split into {len(chunks)} chunks ({unique_count} unique).")
 
     system_prompt_base = f"""
     You are a world-class subtitle translator and linguist specializing in {target_language}.
@@ -87,8 +198,15 @@ def translate_full_text(full_text, target_language="Portuguese"):
     Return ONLY the translated text. No notes, no explanations, no preambles, no postambles.
     """
 
-    for i, chunk in enumerate(chunks):
-        print(f"      Processing Chunk {i+1}/{len(chunks)} ({len(chunk)} chars)...")
+    for i, (chunk, _, chunk_tokens) in enumerate(packed):
+        if chunk in translated_map:
+            print(f"      Chunk {i+1}/{len(chunks)} is a duplicate. Reusing previous translation.")
+            translated_text = translated_map[chunk]
+            translated_chunks.append(translated_text)
+            previous_context = translated_text[-CONTEXT_SIZE:] if len(translated_text) > CONTEXT_SIZE else translated_text
+            continue
+
+        print(f"      Processing Chunk {i+1}/{len(chunks)} ({len(chunk)} chars, ~{chunk_tokens} tokens)...")
         
         context_instruction = ""
         if previous_context:
@@ -99,25 +217,13 @@ def translate_full_text(full_text, target_language="Portuguese"):
             """
         
         # Add context from the NEXT chunk if available (lookahead) could be useful but complex to implement here.
-        
-        user_content = f"""
-            [SOURCE TEXT TO TRANSLATE]:
-            {chunk}
-        """
 
         try:
-            start_time = time.perf_counter()
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt_base + context_instruction},
-                    {"role": "user", "content": user_content}
-                ]
+            translated_text = _translate_chunk(
+                client, chunk, system_prompt_base + context_instruction, target_language, f"TRANSLATE-CHUNK-{i+1}"
             )
-            log_openai_usage(f"TRANSLATE-CHUNK-{i+1}", start_time, response)
-            
-            translated_text = response.choices[0].message.content.strip()
             translated_chunks.append(translated_text)
+            translated_map[chunk] = translated_text
             
             # Update context for next chunk
             previous_context = translated_text[-CONTEXT_SIZE:] if len(translated_text) > CONTEXT_SIZE else translated_text
@@ -126,12 +232,15 @@ def translate_full_text(full_text, target_language="Portuguese"):
             print(f"   ❌ Translation Error on chunk {i+1}: {e}")
             translated_chunks.append(chunk) # Fallback to original
 
-    full_translation = " ".join(translated_chunks)
+    # Sentences are stripped, so put back the whitespace leading the text (trailing whitespace is in the last separator)
+    leading = full_text[:len(full_text) - len(full_text.lstrip())] if chunks else ""
+    full_translation = leading + join_chunks(chunks, translated_chunks)
     return full_translation, chunks, translated_chunks
 
-def verify_translation_quality(source_chunks, translated_chunks, target_language="Portuguese"):
+def verify_translation_quality(source_chunks, translated_chunks, target_language="Portuguese", use_cache=True):
     """
     Verifies and refines the translation chunk by chunk using a rigorous QA process.
+    Refinements are cached per (source, draft, language, prompt); pass use_cache=False to force fresh calls.
     """
     print(f"\n   🕵️ Verifying and Refining Translation Quality...")
     
@@ -166,7 +275,15 @@ def verify_translation_quality(source_chunks, translated_chunks, target_language
     If it needs improvement, output ONLY the improved version.
     """
     
-    for i, (source, draft) in enumerate(zip(source_chunks, translated_chunks)):
+    for i, ((source, _), draft) in enumerate(zip(source_chunks, translated_chunks)):
+        cache_key = tm.refinement_key(source, draft, target_language, system_prompt)
+        if use_cache:
+            cached = tm.lookup_refinement(cache_key)
+            if cached is not None:
+                print(f"      Chunk {i+1}/{len(source_chunks)}: reusing cached refinement.")
+                refined_chunks.append(cached)
+                continue
+
         print(f"      Refining Chunk {i+1}/{len(source_chunks)}...")
         
         user_content = f"""
@@ -195,9 +312,10 @@ def verify_translation_quality(source_chunks, translated_chunks, target_language
             # Sanity check: if refined text is vastly different in length (e.g. empty or double), warn or fallback?
             # For now, trust the model.
             refined_chunks.append(refined_text)
+            tm.store_refinement(cache_key, target_language, refined_text)
             
         except Exception as e:
             print(f"   ❌ Verification Error on chunk {i+1}: {e}")
             refined_chunks.append(draft) # Fallback to draft
 
-    return " ".join(refined_chunks)
\ No newline at end of file
+    return join_chunks(source_chunks, refined_chunks)
\ No newline at end of file
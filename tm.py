@@ -0,0 +1,135 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# --- TRANSLATION MEMORY ---
+# Persistent sentence-level cache of previous translations, keyed by sha256(sentence + target_language).
+# The same database also caches verification results (refinements) per (source, draft) chunk pair.
+# Entries older than their TTL are ignored (and overwritten on the next store).
+# Manual override: set TRANSLATION_MEMORY=off to bypass both caches, or call purge() to drop entries.
+TM_PATH = os.getenv("TRANSLATION_MEMORY_PATH", "translation_memory.db")
+TM_TTL_DAYS = 30
+REFINEMENT_TTL_DAYS = 90
+TM_ENABLED = os.getenv("TRANSLATION_MEMORY", "on").lower() not in ("off", "0", "false")
+
+_conn = None
+_lock = threading.Lock()
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(TM_PATH, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS tm ("
+            "src_hash TEXT PRIMARY KEY, target_lang TEXT, translation TEXT, ts INTEGER)"
+        )
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS refinements ("
+            "key TEXT PRIMARY KEY, target_lang TEXT, refined TEXT, ts INTEGER)"
+        )
+        _conn.commit()
+    return _conn
+
+def sentence_key(sentence, target_language):
+    return hashlib.sha256((sentence.strip() + target_language).encode("utf-8")).hexdigest()
+
+def lookup(sentences, target_language):
+    """
+    Looks up a list of source sentences.
+    Returns: {index: translation} for every sentence found (and not expired) in the TM.
+    """
+    if not TM_ENABLED or not sentences:
+        return {}
+
+    keys = [sentence_key(s, target_language) for s in sentences]
+    min_ts = int(time.time()) - TM_TTL_DAYS * 86400
+
+    try:
+        with _lock:
+            conn = _get_conn()
+            found = {}
+            unique_keys = list(set(keys))
+            # SQLite limits the number of bound parameters, so query in slices
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT src_hash, translation FROM tm WHERE ts >= ? AND src_hash IN ({placeholders})",
+                    [min_ts, *batch]
+                ).fetchall()
+                found.update(rows)
+    except sqlite3.Error as e:
+        print(f"   ⚠️ Translation memory lookup failed: {e}")
+        return {}
+
+    return {i: found[k] for i, k in enumerate(keys) if k in found}
+
+def store(pairs, target_language):
+    """
+    Stores (source_sentence, translated_sentence) pairs in the TM.
+    """
+    if not TM_ENABLED or not pairs:
+        return
+
+    now = int(time.time())
+    rows = [(sentence_key(src, target_language), target_language, tgt.strip(), now) for src, tgt in pairs if tgt.strip()]
+
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.executemany("INSERT OR REPLACE INTO tm (src_hash, target_lang, translation, ts) VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"   ⚠️ Translation memory store failed: {e}")
+
+def refinement_key(source, draft, target_language, prompt=""):
+    """
+    Cache key for a verification call. The prompt is part of the key, so editing it invalidates old entries.
+    """
+    return hashlib.sha256("\x00".join((source, draft, target_language, prompt)).encode("utf-8")).hexdigest()
+
+def lookup_refinement(key):
+    """
+    Returns the cached refined text for key, or None.
+    """
+    if not TM_ENABLED:
+        return None
+
+    min_ts = int(time.time()) - REFINEMENT_TTL_DAYS * 86400
+    try:
+        with _lock:
+            row = _get_conn().execute("SELECT refined FROM refinements WHERE key = ? AND ts >= ?", (key, min_ts)).fetchone()
+    except sqlite3.Error as e:
+        print(f"   ⚠️ Refinement cache lookup failed: {e}")
+        return None
+    return row[0] if row else None
+
+def store_refinement(key, target_language, refined):
+    if not TM_ENABLED or not refined.strip():
+        return
+
+    try:
+        with _lock:
+            conn = _get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO refinements (key, target_lang, refined, ts) VALUES (?, ?, ?, ?)",
+                (key, target_language, refined, int(time.time()))
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"   ⚠️ Refinement cache store failed: {e}")
+
+def purge(target_language=None):
+    """
+    Manual override: drops all entries (or only those of target_language) from both caches.
+    """
+    with _lock:
+        conn = _get_conn()
+        for table in ("tm", "refinements"):
+            if target_language:
+                conn.execute(f"DELETE FROM {table} WHERE target_lang = ?", (target_language,))
+            else:
+                conn.execute(f"DELETE FROM {table}")
+        conn.commit()
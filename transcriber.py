@@ -1,9 +1,18 @@
 import os
+import copy
+import glob
+import gzip
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import tempfile
 import ffmpeg
 from openai import OpenAI
 from dotenv import load_dotenv
 from deepgram import DeepgramClient
-from utils import get_llm_client
+from utils import get_llm_client, get_http_client, response_to_dict
 # REMOVE deepgram_captions logic
 # from deepgram_captions import DeepgramConverter, webvtt
 
@@ -12,25 +21,47 @@ from normalizer import normalize_proper_nouns
 
 load_dotenv()
 
-def extract_audio(video_path, output_audio_path="temp_audio.mp3"):
+# Long audio is split into AUDIO_CHUNK_SECONDS pieces and sent to Deepgram concurrently
+AUDIO_CHUNK_SECONDS = 120
+DEEPGRAM_CONCURRENCY = max(1, int(os.getenv("DEEPGRAM_CONCURRENCY", "5")))
+UPLOAD_BLOCK_SIZE = 1 << 16 # Bytes per block when streaming audio uploads
+
+# Deepgram model selection: "speed" uses the lower-latency Nova-2 on short clips, everything else Nova-3
+SHORT_AUDIO_SECONDS = 60
+
+# Finished transcriptions are cached by audio content hash + options (re-runs skip Deepgram and the LLM correction).
+# Entries older than TRANSCRIPTION_CACHE_TTL_DAYS are ignored and deleted on the next store.
+TRANSCRIPTION_CACHE_DIR = os.getenv("TRANSCRIPTION_CACHE_DIR", "cache")
+TRANSCRIPTION_CACHE_TTL_DAYS = 30
+
+def extract_audio(video_path, output_audio_path="temp_audio.wav"):
     """
     Step 2: Extracts audio track from video file using FFmpeg.
-    Compresses to MP3 to save bandwidth/cost.
+    Outputs 16 kHz mono 16-bit PCM WAV (Deepgram's native ingest format, no server-side decode),
+    band-limited to the speech range to strip rumble and hiss.
     """
     # If no specific name provided, make a unique one based on the video name
     if output_audio_path is None:
         base_name = os.path.splitext(video_path)[0]
-        output_audio_path = f"{base_name}_audio.mp3"
+        output_audio_path = f"{base_name}_audio.wav"
     
     print(f"   🎥 Extracting audio from {os.path.basename(video_path)}...")
     
     try:
-        # Run ffmpeg command: input video -> map audio (0:a) -> output mp3
+        # Run ffmpeg command: input video -> map audio (0:a) -> output wav
         # -y means 'overwrite output file if exists'
+        # NOTE: no silenceremove here - cutting silence would shift every timestamp and desync the subtitles.
         (
             ffmpeg
             .input(video_path)
-            .output(output_audio_path, ab='64k', ac=1, loglevel="quiet") # 64k bitrate is enough for speech
+            .output(
+                output_audio_path,
+                ar=16000,
+                ac=1,
+                acodec='pcm_s16le',
+                af='highpass=f=200,lowpass=f=3000',
+                loglevel="quiet"
+            )
             .overwrite_output()
             .run()
         )
@@ -41,6 +72,10 @@ def extract_audio(video_path, output_audio_path="temp_audio.mp3"):
         print(f"   ❌ FFmpeg Error: {e}")
         return None
 
+# Zero-padded number strings, indexed instead of formatted per timestamp
+_TWOD = tuple(f"{i:02d}" for i in range(100))
+_THREED = tuple(f"{i:03d}" for i in range(1000))
+
 def format_timestamp(seconds):
     """
     Converts float seconds to WebVTT timestamp format: HH:MM:SS.mmm
@@ -50,10 +85,16 @@ def format_timestamp(seconds):
     
     milliseconds = int((seconds % 1) * 1000)
     int_seconds = int(seconds)
+    hours, rest = divmod(int_seconds, 3600)
+    minutes, seconds_rem = divmod(rest, 60)
+    
+    # Table lookup covers 0 <= hours < 100; anything else (negative, 100h+) takes the format path
+    if 0 <= int_seconds and hours < 100:
+        return f"{_TWOD[hours]}:{_TWOD[minutes]}:{_TWOD[seconds_rem]}.{_THREED[milliseconds]}"
+    
     hours = int_seconds // 3600
     minutes = (int_seconds % 3600) // 60
     seconds_rem = int_seconds % 60
-    
     return f"{hours:02}:{minutes:02}:{seconds_rem:02}.{milliseconds:03}"
 
 def generate_vtt_from_utterances(utterances):
@@ -61,7 +102,7 @@ def generate_vtt_from_utterances(utterances):
     Generates a WebVTT string from the list of utterances.
     Formats multi-speaker utterances with dialogue dashes (-).
     """
-    vtt_output = "WEBVTT\n\n"
+    parts = ["WEBVTT\n\n"] # Joined once at the end (no quadratic string +=)
     
     last_speaker = None
     
@@ -81,69 +122,289 @@ def generate_vtt_from_utterances(utterances):
         last_speaker = speaker
         
         # Output block
-        vtt_output += f"{start_time} --> {end_time}\n{text}\n\n"
+        parts.append(f"{start_time} --> {end_time}\n{text}\n\n")
         
-    return vtt_output
+    return "".join(parts)
 
-def transcribe_audio(audio_path, use_correction=True, source_language=None):
+_deepgram_client = None
+
+def get_deepgram_client():
     """
-    Step 3: Sends audio to Deepgram (Nova-3) to get VTT and Text.
+    Module-level Deepgram client, created on first use and reused across calls/chunks
+    (shares the pooled HTTP client, so chunk uploads don't each pay a TLS handshake).
     """
-    print("   🎙️ Sending audio to Deepgram Nova-3 API...")
+    global _deepgram_client
+    if _deepgram_client is None:
+        _deepgram_client = DeepgramClient(api_key=os.getenv("DEEPGRAM_API_KEY"), httpx_client=get_http_client())
+    return _deepgram_client
+
+def get_audio_duration(audio_path):
+    """
+    Returns the audio duration in seconds (0.0 if it can't be probed).
+    """
+    try:
+        return float(ffmpeg.probe(audio_path)["format"]["duration"])
+    except Exception as e:
+        print(f"   ⚠️ Could not probe audio duration: {e}")
+        return 0.0
+
+def split_audio(audio_path, output_dir, segment_seconds=AUDIO_CHUNK_SECONDS):
+    """
+    Splits audio into fixed-length segments (stream copy, so PCM cuts are sample-exact).
+    Returns: list of (chunk_path, offset_seconds) in playback order.
+    """
+    ext = os.path.splitext(audio_path)[1] or ".wav"
+    pattern = os.path.join(output_dir, f"chunk_%04d{ext}")
+    (
+        ffmpeg
+        .input(audio_path)
+        .output(pattern, f="segment", segment_time=segment_seconds, c="copy", loglevel="quiet")
+        .overwrite_output()
+        .run()
+    )
+    chunk_paths = sorted(glob.glob(os.path.join(output_dir, f"chunk_*{ext}")))
+    return [(path, i * float(segment_seconds)) for i, path in enumerate(chunk_paths)]
+
+class _AudioFileStream:
+    """
+    Upload body that streams the file from disk in blocks instead of reading it into memory.
+    Unlike a generator it can be iterated again, so SDK retries resend the whole file.
+    """
+    def __init__(self, path, block_size=UPLOAD_BLOCK_SIZE):
+        self.path = path
+        self.block_size = block_size
+    
+    def __iter__(self):
+        with open(self.path, "rb") as file:
+            for block in iter(lambda: file.read(self.block_size), b""):
+                yield block
+
+def _transcribe_file(deepgram_client, audio_path, options):
+    # Using deepgram-sdk v3+ structure: listen.v1.media.transcribe_file
+    # The body is streamed (chunked upload), peak memory no longer grows with the audio size
+    response = deepgram_client.listen.v1.media.transcribe_file(
+        request=_AudioFileStream(audio_path),
+        **options
+    )
+    return response_to_dict(response)
+
+async def _transcribe_chunk(deepgram_client, path, options, sem):
+    async with sem:
+        # The SDK call is blocking, run it in a worker thread
+        return await asyncio.to_thread(_transcribe_file, deepgram_client, path, options)
+
+async def _transcribe_chunks(deepgram_client, chunks, options):
+    sem = asyncio.Semaphore(DEEPGRAM_CONCURRENCY)
+    return await asyncio.gather(*[_transcribe_chunk(deepgram_client, path, options, sem) for path, _ in chunks])
+
+def _shifted(item, offset):
+    # Copy instead of mutating: word dicts may be shared between utterances and the channel alternative
+    item = dict(item)
+    if "start" in item: item["start"] += offset
+    if "end" in item: item["end"] += offset
+    return item
+
+def merge_chunk_responses(responses, offsets):
+    """
+    Merges per-chunk Deepgram responses into one, shifting utterance/word timestamps by each chunk's offset.
+    The first response is used as the base (metadata, channel layout).
+    """
+    utterances = []
+    words = []
+    transcripts = []
+    
+    for response, offset in zip(responses, offsets):
+        results = response.get("results", {})
+        for u in results.get("utterances") or []:
+            u = _shifted(u, offset)
+            u["words"] = [_shifted(w, offset) for w in u.get("words") or []]
+            utterances.append(u)
+        try:
+            alternative = results["channels"][0]["alternatives"][0]
+        except (KeyError, IndexError):
+            continue
+        words.extend(_shifted(w, offset) for w in alternative.get("words") or [])
+        if alternative.get("transcript"):
+            transcripts.append(alternative["transcript"])
     
+    utterances.sort(key=lambda u: u.get("start", 0))
+    
+    merged = responses[0]
+    merged.setdefault("results", {})["utterances"] = utterances
+    try:
+        alternative = merged["results"]["channels"][0]["alternatives"][0]
+        alternative["transcript"] = " ".join(transcripts)
+        alternative["words"] = words
+        alternative.pop("paragraphs", None) # Only described the first chunk
+    except (KeyError, IndexError):
+        pass
+    return merged
+
+def transcribe_with_deepgram(deepgram_client, audio_path, options, duration=None):
+    """
+    Sends audio to Deepgram and returns the response as a dict.
+    Long files are split into AUDIO_CHUNK_SECONDS chunks transcribed concurrently
+    (bounded by DEEPGRAM_CONCURRENCY), then merged back onto one timeline.
+    """
+    if duration is None:
+        duration = get_audio_duration(audio_path)
+    
+    # Short files: one request (splitting would only add boundary cuts)
+    if duration <= AUDIO_CHUNK_SECONDS * 2:
+        return _transcribe_file(deepgram_client, audio_path, options)
+    
+    chunk_dir = tempfile.mkdtemp(prefix="dg_chunks_")
+    try:
+        chunks = split_audio(audio_path, chunk_dir)
+        print(f"   ✂️ Audio is {duration/60:.1f} min. Transcribing {len(chunks)} chunks (concurrency {DEEPGRAM_CONCURRENCY})...")
+        
+        if not options.get("detect_language"):
+            responses = asyncio.run(_transcribe_chunks(deepgram_client, chunks, options))
+        else:
+            # Transcribe the first chunk alone and pin the language detected on it,
+            # so every chunk is transcribed consistently
+            first = _transcribe_file(deepgram_client, chunks[0][0], options)
+            rest_options = dict(options)
+            try:
+                detected = first["results"]["channels"][0]["detected_language"]
+            except (KeyError, IndexError):
+                detected = None
+            if detected:
+                rest_options.pop("detect_language")
+                rest_options["language"] = detected
+            rest = asyncio.run(_transcribe_chunks(deepgram_client, chunks[1:], rest_options)) if len(chunks) > 1 else []
+            responses = [first, *rest]
+        
+        # NOTE: diarization speaker ids are per-chunk, so a dash may appear at a chunk boundary.
+        return merge_chunk_responses(responses, [offset for _, offset in chunks])
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+def _hash_file(path):
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+def _cache_lookup(key):
+    path = os.path.join(TRANSCRIPTION_CACHE_DIR, f"{key}.json.gz")
+    try:
+        if os.path.getmtime(path) < time.time() - TRANSCRIPTION_CACHE_TTL_DAYS * 86400:
+            return None
+    except OSError:
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"   ⚠️ Ignoring unreadable transcription cache entry {path}: {e}")
+        return None
+
+def _cache_store(key, vtt, text, raw_response):
+    """
+    Stores the final (vtt, text) plus the raw Deepgram response (to re-run apply_corrections offline).
+    """
+    path = os.path.join(TRANSCRIPTION_CACHE_DIR, f"{key}.json.gz")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(TRANSCRIPTION_CACHE_DIR, exist_ok=True)
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            # default=str: SDK responses carry non-JSON values (e.g. datetime metadata)
+            json.dump({"vtt": vtt, "text": text, "response": raw_response}, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path) # Atomic: a crashed write never leaves a half-written entry
+    except Exception as e:
+        print(f"   ⚠️ Could not write transcription cache: {e}")
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+    _cache_evict_expired()
+
+def _cache_evict_expired():
+    min_mtime = time.time() - TRANSCRIPTION_CACHE_TTL_DAYS * 86400
+    for path in glob.glob(os.path.join(TRANSCRIPTION_CACHE_DIR, "*.json.gz")):
+        try:
+            if os.path.getmtime(path) < min_mtime:
+                os.unlink(path)
+        except OSError:
+            pass # Removed concurrently
+
+def select_model(priority, duration):
+    """
+    Picks the Deepgram model for a priority ("speed", "balanced", "accuracy") and audio duration in seconds.
+    """
+    if priority == "speed" and 0 < duration < SHORT_AUDIO_SECONDS:
+        return "nova-2"
+    return "nova-3"
+
+def transcribe_audio(audio_path, use_correction=True, source_language=None, priority="balanced", want_vtt=True):
+    """
+    Step 3: Sends audio to Deepgram to get VTT and Text.
+    With want_vtt=False only the text is returned (VTT is ""), and utterances/diarization are not requested
+    unless the LLM correction needs them.
+    Results are cached by audio content hash + options.
+    """
     # Initialize clients locally to avoid crashing at import-time
     openai_client = get_llm_client()
-    deepgram_client = DeepgramClient(api_key=os.getenv("DEEPGRAM_API_KEY"))
+    deepgram_client = get_deepgram_client()
     
     try:
-        # 1. Read Audio File
-        with open(audio_path, "rb") as file:
-            buffer_data = file.read()
-        
-        # 2. Configure Deepgram Options
+        # 1. Configure Deepgram Options
         # smart_format=Tr
         # italization
-        # model="nova-3": Fastest and most accurate model
+        # model: nova-3 (most accurate) unless select_model picks nova-2 for short "speed" clips
+        duration = get_audio_duration(audio_path)
         options = {
-            "model": "nova-3",
+            "model": select_model(priority, duration),
             "smart_format": True,
-            "utterances": True,      # Required for VTT conversion
-            "diarize": True,         # Required for identifying overlapping dialogue
         }
+        if want_vtt or use_correction:
+            options["utterances"] = True # Required for VTT conversion and the LLM correction
+        if want_vtt:
+            options["diarize"] = True    # Required for identifying overlapping dialogue
         
         if source_language and source_language != "auto":
             options["language"] = source_language
         else:
             options["detect_language"] = True
         
-        # 3. Call API (Once)
-        # Using deepgram-sdk v3+ structure: listen.v1.media.transcribe_file
-        response = deepgram_client.listen.v1.media.transcribe_file(
-            request=buffer_data,
-            **options
-        )
+        # 2. Cache lookup (key covers the audio bytes AND everything that changes the output)
+        cache_options = dict(options, use_correction=use_correction)
+        cache_key = _hash_file(audio_path) + "_" + hashlib.sha1(json.dumps(cache_options, sort_keys=True).encode()).hexdigest()
+        cached = _cache_lookup(cache_key)
+        if cached:
+            print("   ♻️ Transcription cache hit. Skipping Deepgram.")
+            return cached["vtt"], cached["text"]
+        
+        # 3. Call API (chunked + concurrent for long audio), returned as dict
+        print(f"   🎙️ Sending audio to Deepgram {options['model'].title()} API...")
+        response = transcribe_with_deepgram(deepgram_client, audio_path, options, duration)
+        raw_response = copy.deepcopy(response) # Normalization/correction below patch the dict in place
         
         # 3b. Normalize inconsistent proper nouns using confidence data
         #     Must run on dict form so we can access word-level confidence
-        import json
-        if not isinstance(response, dict):
-            if hasattr(response, "to_dict"): response = response.to_dict()
-            elif hasattr(response, "model_dump"): response = response.model_dump()
-            else: response = json.loads(response.to_json())
         response = normalize_proper_nouns(response)
 
         # 4. LLM Correction
         if use_correction:
             print("   🧠 Analyzing and correcting transcription...")
             # This updates response['results']['utterances'] transcript text
-            response, transcript_text = apply_corrections(response, openai_client)
+            response, transcript_text, corrected = apply_corrections(response, openai_client)
         else:
             print("   ⏩ Skipping LLM correction (User disabled it).")
             transcript_text = response["results"]["channels"][0]["alternatives"][0]["transcript"]
+            corrected = True # Nothing to correct
+        # A failed correction is not cached: the next run retries it instead of reusing the uncorrected result
+        if not corrected:
+            cache_key = None
         
 
         # 5b. Normalize Text (Fix "U. S." -> "U.S.")
         transcript_text = normalize_spaced_acronyms(transcript_text)
+        
+        if not want_vtt:
+            if cache_key:
+                _cache_store(cache_key, "", transcript_text, raw_response)
+            print("   ✅ Transcription complete (text only).")
+            return "", transcript_text
 
         try:
             utterances = response["results"]["utterances"]
@@ -157,6 +418,8 @@ def transcribe_audio(audio_path, use_correction=True, source_language=None):
                  u['transcript'] = normalize_spaced_acronyms(u['transcript'])
 
         transcript_vtt = generate_vtt_from_utterances(utterances)
+        if cache_key:
+            _cache_store(cache_key, transcript_vtt, transcript_text, raw_response)
         
         print("   ✅ Transcription complete.")
         return transcript_vtt, transcript_text
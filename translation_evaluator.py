@@ -1,12 +1,53 @@
 import os
+import sys
+import json
 import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
 from openai import OpenAI
 from dotenv import load_dotenv
-from utils import log_openai_usage, get_llm_client, get_model_name
+from utils import log_openai_usage, get_llm_client, get_llm_provider, get_model_name
 
 load_dotenv()
 client = get_llm_client()
 
+# --- EVALUATION MODE ---
+# "realtime" (default): one synchronous chat completion per job. Always used with OpenRouter (no Batch API).
+# "batch": requests are spooled to EVAL_BATCH_PATH and submitted through the OpenAI Batch API
+# (50% price, results within 24h). Finished batches are fetched into the quality log by
+# collect_eval_batches(), e.g. from cron: `python translation_evaluator.py collect`.
+# Only enable it where EVAL_PENDING_PATH persists and the collector is scheduled: the pending batch ids live
+# only in that file (on Cloud Run it is lost with the container, and the paid results are never collected).
+EVAL_MODE = os.getenv("EVAL_MODE", "realtime").lower()
+if EVAL_MODE not in ("realtime", "batch"):
+    print(f"⚠️ Unknown EVAL_MODE={EVAL_MODE!r} (expected 'realtime' or 'batch'), using realtime.")
+    EVAL_MODE = "realtime"
+EVAL_BATCH_PATH = os.getenv("EVAL_BATCH_PATH", "eval_batch.jsonl")
+EVAL_PENDING_PATH = os.getenv("EVAL_PENDING_PATH", "eval_batches_pending.jsonl")
+# Spooled requests per submitted batch. Cloud Run job containers don't outlive the job, so submit right away by default.
+EVAL_BATCH_SIZE = max(1, int(os.getenv("EVAL_BATCH_SIZE", "1")))
+QUALITY_LOG_PATH = "translation_quality_log.txt"
+
+_spool_lock = threading.Lock()
+
+# Quality log writes go through a queue: the file stays open in a single listener thread,
+# so evaluations never block on open()/close() and concurrent entries can't interleave.
+_log_q = queue.Queue(-1)
+_log_file_handler = logging.FileHandler(QUALITY_LOG_PATH, encoding="utf-8", delay=True)
+_log_file_handler.setFormatter(logging.Formatter("%(message)s"))
+_listener = logging.handlers.QueueListener(_log_q, _log_file_handler)
+_listener.start()
+atexit.register(_listener.stop) # Drains the queue before exit
+
+_eval_logger = logging.getLogger("eval")
+_eval_logger.setLevel(logging.INFO)
+_eval_logger.propagate = False
+_eval_logger.addHandler(logging.handlers.QueueHandler(_log_q))
+
 def evaluate_translations(original_text, text_v1, text_v2, target_language="Portuguese"):
     """
     Compares two translation versions and logs the winner.
@@ -57,38 +98,176 @@ def evaluate_translations(original_text, text_v1, text_v2, target_language="Port
     {text_v2}
     """
 
+    model = get_model_name("gpt-5-nano")
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
+    if EVAL_MODE == "batch" and get_llm_provider() == "openai":
+        _enqueue_batch_request(model, messages, target_language, len(original_text))
+        return
+
     try:
         start_time = time.perf_counter()
         
         # Using a capable model for evaluation. 
         response = client.chat.completions.create(
-            model=get_model_name("gpt-5-nano"),
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ],
+            model=model,
+            messages=messages,
             response_format={"type": "json_object"}
         )
         
         log_openai_usage("EVALUATOR", start_time, response)
         
         result_json = response.choices[0].message.content
-        
-        # Append to log file
-        log_entry = f"""
+        _write_log_entry(target_language, len(original_text), result_json)
+            
+        print(f"   ✅ Evaluation Complete. Logged to {QUALITY_LOG_PATH}")
+
+    except Exception as e:
+        print(f"   ❌ Evaluation Error: {e}")
+
+def _write_log_entry(target_language, original_len, result_json, timestamp=None):
+    # Append to log file (buffered through the queue listener)
+    log_entry = f"""
 --------------------------------------------------
-Timestamp: {time.strftime("%Y-%m-%d %H:%M:%S")}
+Timestamp: {timestamp or time.strftime("%Y-%m-%d %H:%M:%S")}
 Target Language: {target_language}
-Original Len: {len(original_text)} chars
+Original Len: {original_len} chars
 
 Evaluation Result:
 {result_json}
 --------------------------------------------------
 """
-        with open("translation_quality_log.txt", "a", encoding="utf-8") as f:
-            f.write(log_entry)
-            
-        print(f"   ✅ Evaluation Complete. Logged to translation_quality_log.txt")
+    _eval_logger.info(log_entry)
 
+def _enqueue_batch_request(model, messages, target_language, original_len):
+    """
+    Appends one chat completion request to the rolling batch file and submits the batch once it is full.
+    """
+    entry = {
+        "custom_id": f"eval-{uuid.uuid4().hex}",
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {"model": model, "messages": messages, "response_format": {"type": "json_object"}},
+        # Not part of the Batch API format: stripped on submit, kept to write the log entry later
+        "meta": {"target_language": target_language, "original_len": original_len, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")}
+    }
+    try:
+        with _spool_lock:
+            with open(EVAL_BATCH_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            with open(EVAL_BATCH_PATH, encoding="utf-8") as f:
+                spooled = sum(1 for line in f if line.strip())
+    except OSError as e:
+        print(f"   ❌ Evaluation Error: could not spool batch request: {e}")
+        return
+
+    print(f"   📥 Evaluation queued for batch ({spooled}/{EVAL_BATCH_SIZE}).")
+    if spooled >= EVAL_BATCH_SIZE:
+        flush_eval_batch()
+
+def flush_eval_batch():
+    """
+    Submits all spooled evaluation requests as one Batch API job.
+    Returns the batch id (None if nothing was submitted).
+    """
+    with _spool_lock:
+        if not os.path.exists(EVAL_BATCH_PATH):
+            return None
+        with open(EVAL_BATCH_PATH, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        os.remove(EVAL_BATCH_PATH)
+    if not entries:
+        return None
+
+    meta = {entry["custom_id"]: entry.pop("meta", {}) for entry in entries}
+    payload = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries).encode("utf-8")
+
+    try:
+        batch_file = client.files.create(file=("eval_batch.jsonl", payload), purpose="batch")
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
     except Exception as e:
-        print(f"   ❌ Evaluation Error: {e}")
+        print(f"   ❌ Evaluation batch submit failed: {e}")
+        # Put the requests back so the next flush retries them
+        with _spool_lock:
+            with open(EVAL_BATCH_PATH, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    entry["meta"] = meta[entry["custom_id"]]
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return None
+
+    with _spool_lock:
+        with open(EVAL_PENDING_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"batch_id": batch.id, "meta": meta}, ensure_ascii=False) + "\n")
+
+    print(f"   📦 Submitted evaluation batch {batch.id} ({len(entries)} requests).")
+    return batch.id
+
+def collect_eval_batches():
+    """
+    Polls the submitted evaluation batches and writes finished results into the quality log.
+    Returns the number of evaluations logged.
+    """
+    with _spool_lock:
+        if not os.path.exists(EVAL_PENDING_PATH):
+            return 0
+        with open(EVAL_PENDING_PATH, encoding="utf-8") as f:
+            pending = [json.loads(line) for line in f if line.strip()]
+
+    done = set()
+    logged = 0
+    for item in pending:
+        try:
+            batch = client.batches.retrieve(item["batch_id"])
+        except Exception as e:
+            print(f"   ⚠️ Could not retrieve evaluation batch {item['batch_id']}: {e}")
+            continue
+
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            continue
+
+        # "completed", and also "expired"/"cancelled", which may still carry partial results
+        if batch.output_file_id:
+            output = client.files.content(batch.output_file_id).text
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                body = (result.get("response") or {}).get("body") or {}
+                try:
+                    result_json = body["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, TypeError):
+                    print(f"   ⚠️ Evaluation {result.get('custom_id')} failed: {result.get('error') or body.get('error')}")
+                    continue
+                meta = item["meta"].get(result.get("custom_id"), {})
+                _write_log_entry(meta.get("target_language"), meta.get("original_len"), result_json, meta.get("timestamp"))
+                logged += 1
+
+        if batch.status != "completed":
+            print(f"   ⚠️ Evaluation batch {batch.id} ended with status '{batch.status}'.")
+        done.add(item["batch_id"])
+
+    if done:
+        # Re-read under the lock: a flush may have appended new batches meanwhile
+        with _spool_lock:
+            with open(EVAL_PENDING_PATH, encoding="utf-8") as f:
+                remaining = [line for line in f if line.strip() and json.loads(line)["batch_id"] not in done]
+            with open(EVAL_PENDING_PATH, "w", encoding="utf-8") as f:
+                f.writelines(remaining)
+
+    print(f"   ✅ Collected {logged} evaluation(s) from {len(done)} batch(es). {len(pending) - len(done)} still pending.")
+    return logged
+
+if __name__ == "__main__":
+    # Periodic flusher/collector, e.g. from cron: python translation_evaluator.py [flush|collect]
+    command = sys.argv[1] if len(sys.argv) > 1 else "collect"
+    if command == "flush":
+        flush_eval_batch()
+    else:
+        collect_eval_batches()
@@ -1,60 +1,137 @@
 import sys
 import os
+import time
+import threading
+import functools
+import contextvars
+import dataclasses
+import importlib.util
+import httpx
 from openai import OpenAI
 
 # --- PRICING TABLE (Adjust as needed) ---
 # Prices in USD
 PRICING = {
-    # Cost per 1 Million Tokens
-    "gpt-5-nano":  {"input": 0.05, "output": 0.40},
-    "gpt-5.2":  {"input": 1.75, "output": 14.00},
+    # Cost per 1 Million Tokens ("cached_input" = prompt-cache hits; falls back to "input" if missing)
+    "gpt-5-nano":  {"input": 0.05, "cached_input": 0.005, "output": 0.40},
+    "gpt-5.2":  {"input": 1.75, "cached_input": 0.175, "output": 14.00},
     "deepseek/deepseek-v3.2": {"input": 0.25, "output": 0.40},
     "whisper-1": 0.0043  # Cost per MINUTE of audio
 }
 
-def get_llm_client():
-    provider = os.getenv("LLM_PROVIDER")
-    if not provider:
-        provider = "openrouter" if os.getenv("OPENROUTER_API_KEY") else "openai"
-    
-    provider = provider.lower()
+@functools.lru_cache(maxsize=1)
+def get_http_client():
+    """
+    Shared, pooled HTTP client for all API SDKs (OpenAI, Deepgram).
+    Keeps TLS sessions alive across calls instead of re-handshaking per request.
+    """
+    return httpx.Client(
+        http2=importlib.util.find_spec("h2") is not None, # HTTP/2 needs the optional 'h2' package
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        timeout=httpx.Timeout(600)
+    )
+
+@functools.lru_cache(maxsize=None)
+def _build_llm_client(provider):
     if provider == "openrouter":
         return OpenAI(
             base_url="https://openrouter.ai/api/v1",
-            api_key=os.getenv("OPENROUTER_API_KEY")
+            api_key=os.getenv("OPENROUTER_API_KEY"),
+            http_client=get_http_client()
         )
-    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=get_http_client())
 
-def get_model_name(default_model="gpt-5.2"):
+def response_to_dict(response):
+    """
+    Converts an SDK response (pydantic model, dataclass or plain object) to plain dicts/lists.
+    No JSON serialize + parse round-trip, even for objects without to_dict/model_dump.
+    """
+    if isinstance(response, dict):
+        return response
+    if hasattr(response, "to_dict"): return response.to_dict()
+    if hasattr(response, "model_dump"): return response.model_dump(mode="python")
+    return _to_plain(response)
+
+def _to_plain(value):
+    if isinstance(value, dict):
+        return {k: _to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(v) for v in value]
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {f.name: _to_plain(getattr(value, f.name)) for f in dataclasses.fields(value)}
+    if hasattr(value, "__dict__"):
+        return {k: _to_plain(v) for k, v in vars(value).items() if not k.startswith("_")}
+    return value
+
+def get_llm_provider():
     provider = os.getenv("LLM_PROVIDER")
     if not provider:
         provider = "openrouter" if os.getenv("OPENROUTER_API_KEY") else "openai"
-    
-    provider = provider.lower()
+    return provider.lower()
+
+def get_llm_client():
+    return _build_llm_client(get_llm_provider())
+
+def get_model_name(default_model="gpt-5.2"):
+    provider = get_llm_provider()
     if provider == "openrouter":
         return "deepseek/deepseek-v3.2" # Default openrouter model
     return default_model
 
 
-# Global accumulation variable
-TOTAL_SESSION_COST = 0.0
+class _SessionCost:
+    """
+    Mutable cost accumulator for one job/request session.
+    """
+    __slots__ = ("total", "_lock")
+    
+    def __init__(self):
+        self.total = 0.0
+        self._lock = threading.Lock()
+    
+    def add(self, cost):
+        with self._lock:
+            self.total += cost
+
+# Per-session accumulation: each job/request gets its own accumulator via reset_session_cost().
+# The ContextVar holds a mutable object (not a float), so costs logged from worker threads that run in a
+# copy of the context (contextvars.copy_context().run) still add up to the session that started them.
+# No shared default instance: a context that never called reset_session_cost() gets its own on first use.
+_session_cost = contextvars.ContextVar("session_cost", default=None)
 
 def reset_session_cost():
-    """Resets the cost counter to zero (call at start of job)."""
-    global TOTAL_SESSION_COST
-    TOTAL_SESSION_COST = 0.0
+    """Starts a fresh cost counter for the current context (call at start of job)."""
+    _session_cost.set(_SessionCost())
+
+def _current_session_cost():
+    session_cost = _session_cost.get()
+    if session_cost is None:
+        session_cost = _SessionCost()
+        _session_cost.set(session_cost)
+    return session_cost
 
 def get_session_cost():
-    return TOTAL_SESSION_COST
+    return _current_session_cost().total
+
+@functools.lru_cache(maxsize=32)
+def _resolve_price_key(model):
+    """
+    Maps a response model id to its PRICING key (memoized per model id).
+    """
+    # pricing keys are "gpt-5.2", "gpt-5-nano", etc.
+    # The response.model might be specific like "gpt-5.2-turbo-2025..." so we check containment or exact match
+    for key in PRICING:
+        if key in model:
+            return key
+    
+    print(f"   ⚠️ Warning: Model '{model}' not found in pricing. Using default 'gpt-5-nano'")
+    return "gpt-5-nano" # Default
 
 def log_openai_usage(stage_name, start_time, response):
     """
     Logs usage AND calculates cost for Chat Completions (GPT).
     """
-    global TOTAL_SESSION_COST
-    
     # Calculate duration
-    import time
     duration = time.perf_counter() - start_time
     
     # Extract token usage
@@ -63,39 +140,30 @@ def log_openai_usage(stage_name, start_time, response):
     out_tokens = usage.completion_tokens
     model = response.model
     
-    # Calculate Cost
-    # Calculate Cost
-    cost = 0.0
-    
-    # pricing keys are "gpt-5.2", "gpt-5-nano", etc.
-    # The response.model might be specific like "gpt-5.2-turbo-2025..." so we check containment or exact match
-    price_key = "gpt-5-nano" # Default
+    # Prompt caching: prefix hits are reported in prompt_tokens_details and billed at the cached rate
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", 0) or 0
     
-    for key in PRICING:
-        if key in model:
-            price_key = key
-            break
-            
-    if price_key not in PRICING:
-         print(f"   ⚠️ Warning: Model '{model}' not found in pricing. Using default '{price_key}'")
+    # Calculate Cost
+    price_key = _resolve_price_key(model)
 
     input_price = PRICING[price_key]["input"] / 1_000_000
+    cached_price = PRICING[price_key].get("cached_input", PRICING[price_key]["input"]) / 1_000_000
     output_price = PRICING[price_key]["output"] / 1_000_000
     
-    cost = (in_tokens * input_price) + (out_tokens * output_price)
-    TOTAL_SESSION_COST += cost
+    cost = ((in_tokens - cached_tokens) * input_price) + (cached_tokens * cached_price) + (out_tokens * output_price)
+    _current_session_cost().add(cost)
 
     # Log to console
-    print(f"   📊 [{stage_name}] {in_tokens}in/{out_tokens}out | Time: {duration:.2f}s | Cost: ${cost:.5f}")
+    print(f"   📊 [{stage_name}] {in_tokens}in ({cached_tokens} cached)/{out_tokens}out | Time: {duration:.2f}s | Cost: ${cost:.5f}")
 
 def log_whisper_cost(duration_seconds):
     """
     Calculates cost for Whisper (billed by minute).
     """
-    global TOTAL_SESSION_COST
     minutes = duration_seconds / 60.0
     # Whisper rounds up to nearest second, but usually billed per minute
     cost = minutes * PRICING["whisper-1"]
     
-    TOTAL_SESSION_COST += cost
+    _current_session_cost().add(cost)
     print(f"   📊 [WHISPER] Audio Duration: {minutes:.2f} min | Cost: ${cost:.4f}")
\ No newline at end of file
@@ -1,41 +1,93 @@
 import re
 import os
+import bisect
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import validator_fast # Numba kernels (optional)
+except ImportError:
+    validator_fast = None
+
+# JIT compilation costs seconds on the first call, so the Numba kernels only take over for large cue lists
+NUMBA_MIN_CUES = int(os.getenv("VALIDATOR_NUMBA_MIN_CUES", "5000"))
+
+# 00:00:00.000 --> 00:00:05.000 (compiled once, matched per line)
+_TS = re.compile(r'(\d{2}:\d{2}:\d{2}\.\d{3})\s-->\s(\d{2}:\d{2}:\d{2}\.\d{3})')
+
+def _make_cue(start, end, text_lines):
+    text_clean = "\n".join(text_lines).strip()
+    line_count = len([l for l in text_lines if l.strip()])
+    return {
+        "start": start,
+        "end": end,
+        "duration": end - start,
+        "text": text_clean,
+        "lines": line_count
+    }
+
+def _iter_cue_parts(file_path):
+    """
+    Streams the file line by line (memory is O(one cue), no whole-file regex).
+    Yields (start, end, text_lines) per cue.
+    """
+    start = end = None   # Timing of the cue being read (None = between cues)
+    text_lines = []
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            
+            # Cheap substring test before running the regex
+            match = _TS.search(line) if '-->' in line else None
+            if match:
+                if start is not None:
+                    yield start, end, text_lines
+                start = parse_time(match.group(1))
+                end = parse_time(match.group(2))
+                text_lines = []
+            elif start is not None:
+                if line.strip():
+                    text_lines.append(line)
+                else:
+                    # Blank line closes the cue
+                    yield start, end, text_lines
+                    start = None
+                    
+    if start is not None:
+        yield start, end, text_lines
 
 def parse_vtt_simple(file_path):
     """
     Parses VTT to get a list of cues: {'start': float, 'end': float, 'text': str, 'lines': int}
+    Streams the file line by line (memory is O(one cue), no whole-file regex).
     """
     if not os.path.exists(file_path):
         return []
-        
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Regex to find timestamps and text
-    # 00:00:00.000 --> 00:00:05.000
-    pattern = re.compile(r'(\d{2}:\d{2}:\d{2}\.\d{3})\s-->\s(\d{2}:\d{2}:\d{2}\.\d{3})\n(.*?)(?=\n\n|\Z)', re.DOTALL)
-    matches = pattern.findall(content)
+    return [_make_cue(start, end, text_lines) for start, end, text_lines in _iter_cue_parts(file_path)]
 
-    cues = []
-    for start_str, end_str, text_block in matches:
-        start = parse_time(start_str)
-        end = parse_time(end_str)
-        
-        # Clean text
-        text_clean = text_block.strip()
-        lines = text_clean.split('\n')
-        line_count = len([l for l in lines if l.strip()])
-        
-        cues.append({
-            "start": start,
-            "end": end,
-            "duration": end - start,
-            "text": text_clean,
-            "lines": line_count
-        })
-    return cues
+def parse_vtt_arrays(file_path):
+    """
+    Same as parse_vtt_simple, but fills a CueArray field by field (no per-cue dicts). Needs NumPy.
+    """
+    starts, ends, line_counts, texts = [], [], [], []
+    if os.path.exists(file_path):
+        for start, end, text_lines in _iter_cue_parts(file_path):
+            starts.append(start)
+            ends.append(end)
+            line_counts.append(len([l for l in text_lines if l.strip()]))
+            texts.append("\n".join(text_lines).strip())
+    return CueArray(starts, ends, line_counts, texts)
 
 def parse_time(t_str):
+    # Fast path: fixed-width WebVTT "HH:MM:SS.mmm" -> slice at known offsets (no replace/split/list).
+    # Seconds go through float() on the "SS.mmm" slice so the result is bit-identical to the slow path.
+    if len(t_str) == 12 and t_str[2] == ':' and t_str[5] == ':' and t_str[8] == '.':
+        return int(t_str[0:2])*3600 + int(t_str[3:5])*60 + float(t_str[6:12])
+    
     parts = t_str.replace(',', '.').split(':')
     if len(parts) == 3:
         return int(parts[0])*3600 + int(parts[1])*60 + float(parts[2])
@@ -43,6 +95,220 @@ def parse_time(t_str):
         return int(parts[0])*60 + float(parts[1])
     return 0.0
 
+class CueArray:
+    """
+    Structure-of-arrays cue list (needs NumPy): one array per numeric field, texts stay a list.
+    Checks that only touch start/end/line counts run as vectorized ops instead of walking dicts.
+    Indexing (cues[i]) still returns a cue dict, so code written for parse_vtt_simple's output keeps working.
+    """
+    __slots__ = ("starts", "ends", "line_counts", "char_counts", "texts")
+    
+    def __init__(self, starts, ends, line_counts, texts):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.line_counts = np.asarray(line_counts, dtype=np.int32)
+        self.texts = list(texts)
+        self.char_counts = np.fromiter(map(len, self.texts), np.int64, len(self.texts))
+    
+    @classmethod
+    def from_cues(cls, cues):
+        return cls([c['start'] for c in cues], [c['end'] for c in cues], [c['lines'] for c in cues], [c['text'] for c in cues])
+    
+    def __len__(self):
+        return len(self.texts)
+    
+    def __getitem__(self, i):
+        start = float(self.starts[i])
+        end = float(self.ends[i])
+        return {"start": start, "end": end, "duration": end - start, "text": self.texts[i], "lines": int(self.line_counts[i])}
+    
+    @property
+    def durations(self):
+        return self.ends - self.starts
+
+def _as_cue_array(cues):
+    return cues if isinstance(cues, CueArray) else CueArray.from_cues(cues)
+
+def _bounds(cues):
+    # (starts, ends) as Python lists, from a CueArray or a list of cue dicts
+    if isinstance(cues, CueArray):
+        return cues.starts.tolist(), cues.ends.tolist()
+    return [c['start'] for c in cues], [c['end'] for c in cues]
+
+MIN_BLOCK_DURATION = 0.5   # Only substantial original blocks must be covered
+MIN_OVERLAP = 0.1          # At least 100ms overlap counts as Covered
+COVERAGE_TILE_ROWS = 1024  # NumPy: rows per tile, caps the N x M overlap matrix memory
+
+def _find_uncovered_python(original_cues, target_cues):
+    uncovered = []
+    for i, o_cue in enumerate(original_cues):
+        o_start = o_cue['start']
+        o_end = o_cue['end']
+        
+        # We only care about substantial blocks (e.g. > 0.5s)
+        if o_end - o_start < MIN_BLOCK_DURATION:
+            continue
+            
+        has_overlap = False
+        for t_cue in target_cues:
+            # Check overlap: start1 < end2 AND start2 < end1
+            if o_start < t_cue['end'] and t_cue['start'] < o_end:
+                # Calculate overlap duration
+                overlap_start = max(o_start, t_cue['start'])
+                overlap_end = min(o_end, t_cue['end'])
+                
+                # If we have at least 100ms overlap, we count it as Covered
+                if overlap_end - overlap_start > MIN_OVERLAP:
+                    has_overlap = True
+                    break
+        
+        if not has_overlap:
+            uncovered.append(i)
+    return uncovered
+
+def _find_uncovered_numpy(original_cues, target_cues):
+    originals = _as_cue_array(original_cues)
+    targets = _as_cue_array(target_cues)
+    o_start, o_end = originals.starts, originals.ends
+    t_start, t_end = targets.starts, targets.ends
+    n = len(originals)
+    
+    covered = np.zeros(n, dtype=bool)
+    for row in range(0, n, COVERAGE_TILE_ROWS):
+        rows = slice(row, row + COVERAGE_TILE_ROWS)
+        overlap = np.minimum(o_end[rows, None], t_end[None, :]) - np.maximum(o_start[rows, None], t_start[None, :])
+        covered[rows] = (overlap > MIN_OVERLAP).any(axis=1)
+    
+    substantial = (o_end - o_start) >= MIN_BLOCK_DURATION
+    return np.nonzero(substantial & ~covered)[0].tolist()
+
+def _find_uncovered_bisect(original_cues, target_cues):
+    t_starts, t_ends = _bounds(target_cues)
+    order = sorted(range(len(t_starts)), key=t_starts.__getitem__)
+    t_starts = [t_starts[k] for k in order]
+    t_ends = [t_ends[k] for k in order]
+    # Running max of the ends: lets the backwards walk stop even when a long cue hides behind shorter ones
+    max_ends = []
+    running = float('-inf')
+    for end in t_ends:
+        running = max(running, end)
+        max_ends.append(running)
+    
+    uncovered = []
+    for i, (o_start, o_end) in enumerate(zip(*_bounds(original_cues))):
+        if o_end - o_start < MIN_BLOCK_DURATION:
+            continue
+        
+        # Only targets starting before o_end can overlap; walk back until none of the earlier ones reach o_start
+        j = bisect.bisect_left(t_starts, o_end) - 1
+        has_overlap = False
+        while j >= 0 and max_ends[j] > o_start:
+            if min(o_end, t_ends[j]) - max(o_start, t_starts[j]) > MIN_OVERLAP:
+                has_overlap = True
+                break
+            j -= 1
+        
+        if not has_overlap:
+            uncovered.append(i)
+    return uncovered
+
+def _find_uncovered_numba(original_cues, target_cues):
+    originals = _as_cue_array(original_cues)
+    targets = _as_cue_array(target_cues)
+    order = np.argsort(targets.starts, kind="stable")
+    t_start = targets.starts[order]
+    t_end = targets.ends[order]
+    uncovered = validator_fast.coverage_mask(
+        originals.starts, originals.ends, t_start, t_end, np.maximum.accumulate(t_end),
+        MIN_BLOCK_DURATION, MIN_OVERLAP
+    )
+    return np.nonzero(uncovered)[0].tolist()
+
+def find_uncovered_cues(original_cues, target_cues, method="bisect"):
+    """
+    Returns the indices of substantial original cues with no (> 100ms) overlap with any target cue.
+    method="bisect" (default) only visits target cues that can overlap;
+    method="numpy" vectorizes the full overlap matrix, for batch validation of many files.
+    The bisect scan runs as a compiled Numba kernel (validator_fast) for large inputs when numba is installed.
+    """
+    if not len(original_cues):
+        return []
+    if method == "bisect" and validator_fast is not None and len(original_cues) + len(target_cues) >= NUMBA_MIN_CUES:
+        return _find_uncovered_numba(original_cues, target_cues)
+    if method == "numpy" and np is not None and len(target_cues):
+        return _find_uncovered_numpy(original_cues, target_cues)
+    if method == "python":
+        return _find_uncovered_python(original_cues, target_cues)
+    return _find_uncovered_bisect(original_cues, target_cues)
+
+MAX_CPS = 30.0  # Increased from 25 to 30 for high density tolerance
+
+def _check_target_cues_python(target_cues):
+    """
+    Line count + reading speed checks, fused into one pass over the cue dicts.
+    Returns (line_errors, line_warnings, cps_warnings, max_lines, three_line_count, high_cps_count).
+    """
+    line_errors = []
+    line_warnings = []
+    cps_warnings = []
+    max_lines_found = 0
+    three_line_count = 0
+    high_cps_count = 0
+    
+    for i, cue in enumerate(target_cues):
+        lines = cue['lines']
+        if lines > max_lines_found:
+            max_lines_found = lines
+            
+        if lines > 3:
+            line_errors.append(f"Cue {i+1} has {lines} lines (Limit is 3).")
+        elif lines == 3:
+             three_line_count += 1
+             line_warnings.append(f"Cue {i+1} has 3 lines (Ideal is 2, allowed in High Density).")
+        
+        # Ignore very short silences or empty cues
+        duration = cue['duration']
+        text = cue['text']
+        if duration < 0.1 or not text:
+            continue
+            
+        # len() is unchanged by replacing '\n' with ' ', so count the raw text
+        cps = len(text) / duration
+        
+        if cps > MAX_CPS:
+             high_cps_count += 1
+             cps_warnings.append(f"Cue {i+1} is too fast ({cps:.1f} CPS). Text: {text[:30]}...")
+    
+    return line_errors, line_warnings, cps_warnings, max_lines_found, three_line_count, high_cps_count
+
+def _check_target_cues_numpy(target_cues):
+    """
+    Same checks as _check_target_cues_python, vectorized over a CueArray.
+    """
+    cues = _as_cue_array(target_cues)
+    
+    too_many = np.nonzero(cues.line_counts > 3)[0]
+    three = np.nonzero(cues.line_counts == 3)[0]
+    line_errors = [f"Cue {i+1} has {cues.line_counts[i]} lines (Limit is 3)." for i in too_many.tolist()]
+    line_warnings = [f"Cue {i+1} has 3 lines (Ideal is 2, allowed in High Density)." for i in three.tolist()]
+    
+    # Ignore very short silences or empty cues (empty text <=> zero chars)
+    durations = cues.durations
+    if validator_fast is not None and len(cues) >= NUMBA_MIN_CUES:
+        fast = np.nonzero(validator_fast.check_cps(cues.starts, cues.ends, cues.char_counts, MAX_CPS))[0]
+    else:
+        timed = (durations >= 0.1) & (cues.char_counts > 0)
+        cps = np.zeros(len(cues))
+        np.divide(cues.char_counts, durations, out=cps, where=timed)
+        fast = np.nonzero(timed & (cps > MAX_CPS))[0]
+    cps_warnings = [
+        f"Cue {i+1} is too fast ({cues.char_counts[i] / durations[i]:.1f} CPS). Text: {cues.texts[i][:30]}..."
+        for i in fast.tolist()
+    ]
+    
+    max_lines_found = int(cues.line_counts.max()) if len(cues) else 0
+    return line_errors, line_warnings, cps_warnings, max_lines_found, len(three), len(fast)
+
 def validate_vtt_structure(original_vtt_path, target_vtt_path):
     """
     Checks the generated VTT for:
@@ -54,33 +320,27 @@ def validate_vtt_structure(original_vtt_path, target_vtt_path):
     """
     print(f"\n   🔍 Running VTT Validation...")
     
-    original_cues = parse_vtt_simple(original_vtt_path)
-    target_cues = parse_vtt_simple(target_vtt_path)
+    # SoA cues when NumPy is available (vectorized checks), plain cue dicts otherwise
+    parse = parse_vtt_arrays if np is not None else parse_vtt_simple
+    original_cues = parse(original_vtt_path)
+    target_cues = parse(target_vtt_path)
     
     errors = []
     warnings = []
     
-    if not original_cues:
+    if not len(original_cues):
         errors.append("Original VTT file is empty or missing.")
-    if not target_cues:
+    if not len(target_cues):
         errors.append("Generated Target VTT file is empty or missing.")
         
     if errors:
         return {"valid": False, "errors": errors, "warnings": warnings}
 
-    # --- 1. Line Count Check ---
-    max_lines_found = 0
-    three_line_count = 0
-    
-    for i, cue in enumerate(target_cues):
-        if cue['lines'] > max_lines_found:
-            max_lines_found = cue['lines']
-            
-        if cue['lines'] > 3:
-            errors.append(f"Cue {i+1} has {cue['lines']} lines (Limit is 3).")
-        elif cue['lines'] == 3:
-             three_line_count += 1
-             warnings.append(f"Cue {i+1} has 3 lines (Ideal is 2, allowed in High Density).")
+    # --- 1. Line Count + 3. Reading Speed (CPS), one pass over target_cues ---
+    check_target_cues = _check_target_cues_numpy if np is not None else _check_target_cues_python
+    line_errors, line_warnings, cps_warnings, max_lines_found, three_line_count, high_cps_count = check_target_cues(target_cues)
+    errors.extend(line_errors)
+    warnings.extend(line_warnings)
 
     # --- 2. Global Timing Check ---
     orig_start = original_cues[0]['start']
@@ -106,51 +366,18 @@ def validate_vtt_structure(original_vtt_path, target_vtt_path):
     
     missing_blocks_count = 0
     
-    for i, o_cue in enumerate(original_cues):
-        o_start = o_cue['start']
-        o_end = o_cue['end']
-        
-        # We only care about substantial blocks (e.g. > 0.5s)
-        if o_end - o_start < 0.5:
-            continue
-            
-        has_overlap = False
-        for t_cue in target_cues:
-            # Check overlap: start1 < end2 AND start2 < end1
-            if o_start < t_cue['end'] and t_cue['start'] < o_end:
-                # Calculate overlap duration
-                overlap_start = max(o_start, t_cue['start'])
-                overlap_end = min(o_end, t_cue['end'])
-                overlap_dur = overlap_end - overlap_start
-                
-                # If we have at least 100ms overlap, we count it as Covered
-                if overlap_dur > 0.1:
-                    has_overlap = True
-                    break
-        
-        if not has_overlap:
-            missing_blocks_count += 1
-            errors.append(f"Missing Translation for Cue {i+1} ({o_start:.2f}s - {o_end:.2f}s): No matching target subtitle found.")
+    for i in find_uncovered_cues(original_cues, target_cues):
+        o_cue = original_cues[i]
+        missing_blocks_count += 1
+        errors.append(f"Missing Translation for Cue {i+1} ({o_cue['start']:.2f}s - {o_cue['end']:.2f}s): No matching target subtitle found.")
             
     if missing_blocks_count > 0:
         print(f"   ❌ Found {missing_blocks_count} missing blocks/gaps.")
 
-    # --- 4. Reading Speed Check (CPS) ---
-    high_cps_count = 0
-    for i, cue in enumerate(target_cues):
-        # Ignore very short silences or empty cues
-        if cue['duration'] < 0.1 or not cue['text']: 
-            continue
-            
-        char_count = len(cue['text'].replace('\n', ' '))
-        cps = char_count / cue['duration']
-        
-        if cps > 30.0:  # Increased from 25 to 30 for high density tolerance
-             high_cps_count += 1
-             warnings.append(f"Cue {i+1} is too fast ({cps:.1f} CPS). Text: {cue['text'][:30]}...")
-
+    # --- 4. Reading Speed Check (CPS) (computed in the line count pass) ---
+    warnings.extend(cps_warnings)
     if high_cps_count > 0:
-        warnings.append(f"Found {high_cps_count} blocks with CPS > 30.")
+        warnings.append(f"Found {high_cps_count} blocks with CPS > {MAX_CPS:.0f}.")
 
     # --- Summary ---
     is_valid = len(errors) == 0
@@ -0,0 +1,44 @@
+import numpy as np
+from numba import njit, prange
+
+# --- NUMBA KERNELS FOR THE VTT VALIDATOR ---
+# Compiled versions of the numeric checks in validator.py, run on CueArray fields.
+# Importing this module requires numba; validator.py falls back to NumPy / pure Python without it.
+# cache=True stores the compiled code in __pycache__, so only the first run pays the compile time.
+
+@njit(parallel=True, cache=True)
+def check_cps(starts, ends, char_counts, max_cps):
+    """
+    Boolean mask of cues faster than max_cps (cues shorter than 0.1s or without text are ignored).
+    """
+    n = starts.shape[0]
+    high = np.zeros(n, dtype=np.bool_)
+    for i in prange(n):
+        duration = ends[i] - starts[i]
+        if duration >= 0.1 and char_counts[i] > 0:
+            high[i] = char_counts[i] / duration > max_cps
+    return high
+
+@njit(parallel=True, cache=True)
+def coverage_mask(o_start, o_end, t_start, t_end, t_max_end, min_block, min_overlap):
+    """
+    Boolean mask of substantial original cues with no overlap > min_overlap with any target cue.
+    Same bisect scan as validator._find_uncovered_bisect: t_start/t_end must be sorted by start,
+    t_max_end is the running max of t_end.
+    """
+    n = o_start.shape[0]
+    uncovered = np.zeros(n, dtype=np.bool_)
+    for i in prange(n):
+        if o_end[i] - o_start[i] < min_block:
+            continue
+
+        j = np.searchsorted(t_start, o_end[i]) - 1
+        has_overlap = False
+        while j >= 0 and t_max_end[j] > o_start[i]:
+            if min(o_end[i], t_end[j]) - max(o_start[i], t_start[j]) > min_overlap:
+                has_overlap = True
+                break
+            j -= 1
+
+        uncovered[i] = not has_overlap
+    return uncovered
@@ -1,39 +1,847 @@
 import os
+import re
+import asyncio
+import shutil
+import hashlib
+import tempfile
 import subprocess
+import functools
+import itertools
+import contextlib
+import threading
 import shlex
+import stat
+import atexit
+import time
 
 import platform
 
-def burn_subtitles(video_path, vtt_path, output_path, target_language=None, subtitle_color=None):
+# --- HARDWARE ENCODERS ---
+# hwaccel="auto" uses the first encoder that actually works here, in this order; libx264 (software) otherwise.
+HW_ENCODERS = {
+    "nvenc": "h264_nvenc",
+    "qsv": "h264_qsv",
+    "vaapi": "h264_vaapi",
+}
+VAAPI_DEVICE = os.getenv("VAAPI_DEVICE", "/dev/dri/renderD128")
+
+# Threads per ffmpeg process: set POLYSUB_FFMPEG_THREADS (1-64) to override the automatic split
+FFMPEG_THREADS_OVERRIDE = os.getenv("POLYSUB_FFMPEG_THREADS")
+
+def _threads_per_invocation(n_workers):
+    """
+    ffmpeg threads per process so that n_workers concurrent processes share the CPU instead of each
+    spawning min(cpu_count, 16)+ threads. None (ffmpeg's own default) for a single process without override.
+    """
+    if FFMPEG_THREADS_OVERRIDE:
+        try:
+            threads = int(FFMPEG_THREADS_OVERRIDE)
+        except ValueError:
+            threads = 0
+        if 1 <= threads <= 64:
+            return threads
+        print(f"⚠️ Ignoring POLYSUB_FFMPEG_THREADS={FFMPEG_THREADS_OVERRIDE!r} (expected 1-64).")
+    if n_workers <= 1:
+        return None
+    return max(1, (os.cpu_count() or n_workers) // n_workers)
+
+# Process start-up: CPython launches a child with posix_spawn (or vfork) instead of fork+exec, which would first
+# copy this process's page tables, only when argv[0] is a path (hence _which), there is no preexec_fn, pass_fds, cwd
+# or new session, and close_fds is off or the platform can close them at spawn (3.13+ on glibc 2.34+; vfork otherwise).
+# Keep every ffmpeg/ffprobe call within those limits (pipe inputs need pass_fds: those still avoid a plain fork via vfork).
+@functools.lru_cache(maxsize=None)
+def _which(binary):
+    return shutil.which(binary) or binary
+
+@functools.lru_cache(maxsize=1)
+def _listed_encoders():
+    """
+    Names of the video encoders compiled into ffmpeg (`ffmpeg -encoders`, run once).
+    """
+    try:
+        result = subprocess.run([_which("ffmpeg"), "-hide_banner", "-encoders"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return frozenset()
+    # Lines look like: " V....D h264_nvenc           NVIDIA NVENC H.264 encoder" (legend lines: " V..... = Video")
+    encoders = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if line.startswith(" V") and len(parts) > 1 and parts[1] != "=":
+            encoders.add(parts[1])
+    return frozenset(encoders)
+
+def _hw_device_args(kind):
+    # Global options placed before -i
+    if kind == "vaapi":
+        return ["-vaapi_device", VAAPI_DEVICE]
+    return []
+
+def _hw_filter_suffix(kind):
+    # The subtitles filter draws on system-memory frames; upload them for the GPU encoder afterwards
+    if kind == "nvenc":
+        return ",hwupload_cuda"
+    if kind == "vaapi":
+        return ",format=nv12,hwupload"
+    if kind == "qsv":
+        return ",format=nv12"
+    return ""
+
+def _hw_encoder_args(kind):
+    if kind == "nvenc":
+        return ["-c:v", "h264_nvenc", "-preset", "p4", "-tune", "hq", "-rc", "vbr", "-cq", "23", "-b:v", "0"]
+    if kind == "qsv":
+        return ["-c:v", "h264_qsv", "-preset", "faster", "-global_quality", "23"]
+    if kind == "vaapi":
+        return ["-c:v", "h264_vaapi", "-qp", "23"]
+    return []
+
+# Software (libx264) encoding: the burned text doesn't need the slower presets, the source already limits quality
+X264_CRF = 20
+X264_MAX_VERYFAST_HEIGHT = 1080 # Up to 1080p: veryfast; above (4K): fast
+X264_LONG_SECONDS = 1800 # Longer videos: one preset faster (superfast, veryfast), the runtime matters more there
+X264_PRESETS = ("superfast", "veryfast", "fast")
+
+def _x264_preset(video_path):
+    height = _probe_height(video_path)
+    duration = _probe_duration(video_path)
+    step = 2 if height and height > X264_MAX_VERYFAST_HEIGHT else 1
+    if duration and duration > X264_LONG_SECONDS:
+        step -= 1
+    return X264_PRESETS[step]
+
+def _x264_args(video_path, preset=None, crf=None):
+    if preset is None:
+        preset = _x264_preset(video_path)
+    return ["-c:v", "libx264", "-preset", preset, "-crf", str(X264_CRF if crf is None else crf), "-pix_fmt", "yuv420p"]
+
+@functools.lru_cache(maxsize=None)
+def _hw_encoder_works(kind):
+    """
+    Distro ffmpeg builds list NVENC/QSV/VAAPI even without the hardware, so try a tiny encode (once per kind).
+    """
+    if HW_ENCODERS.get(kind) not in _listed_encoders():
+        return False
+    command = [
+        _which("ffmpeg"), "-hide_banner", "-loglevel", "error", *_hw_device_args(kind),
+        "-f", "lavfi", "-i", "color=c=black:s=256x256:d=0.1",
+        "-vf", "format=yuv420p" + _hw_filter_suffix(kind),
+        *_hw_encoder_args(kind), "-f", "null", "-"
+    ]
+    try:
+        return subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+def select_hwaccel(hwaccel="auto"):
+    """
+    Resolves the hwaccel argument to a working hardware encoder kind ("nvenc", "qsv", "vaapi"),
+    or None for software (libx264). hwaccel: "auto", one of the kinds, or None/"none" to force software.
+    """
+    if not hwaccel or hwaccel == "none":
+        return None
+    candidates = list(HW_ENCODERS) if hwaccel == "auto" else [hwaccel]
+    for kind in candidates:
+        if _hw_encoder_works(kind):
+            return kind
+    if hwaccel != "auto":
+        print(f"⚠️ Hardware encoder '{hwaccel}' is not available. Using software encoding.")
+    return None
+
+# --- OUTPUT CACHE ---
+# Finished burn-ins are kept under BURN_CACHE_DIR, keyed by the video's (mtime, size), the canonical form of the
+# subtitles (see _canonical_vtt) and the ffmpeg command, so re-burning the same subtitles into the same video is a
+# hardlink instead of a transcode, even after edits that don't change what is drawn.
+# Off by default: the pipeline downloads a fresh copy of every video (new mtime), so only repeated burns of the same
+# local file hit it. Set POLYSUB_BURN_CACHE=on to enable; the least recently used entries are deleted once the
+# directory outgrows POLYSUB_BURN_CACHE_MAX_MB. Entries used in the last POLYSUB_BURN_CACHE_MIN_AGE seconds are kept
+# even over the limit, so a trim never deletes subtitles or overlays a running burn is still reading.
+BURN_CACHE_DIR = os.getenv("POLYSUB_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "polysub"))
+BURN_CACHE_ENABLED = os.getenv("POLYSUB_BURN_CACHE", "off").lower() in ("on", "1", "true")
+BURN_CACHE_MAX_BYTES = int(os.getenv("POLYSUB_BURN_CACHE_MAX_MB", "2048")) * 1024 * 1024
+BURN_CACHE_MIN_AGE = float(os.getenv("POLYSUB_BURN_CACHE_MIN_AGE", "3600"))
+_trim_lock = threading.Lock()
+_scratch_dir = None # Per-process stand-in for BURN_CACHE_DIR while the cache is off
+
+def _file_fingerprint(path):
+    # stat only: hashing the content of a multi-GB video would cost more than some encodes
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def _burn_cache_path(video_path, vtt_path, commands, output_path):
+    """
+    Cache file for this burn-in, or None if the cache is disabled.
+    commands: the ffmpeg commands that would produce output_path (their last argument, the output, is not part of the key).
+    """
+    if not BURN_CACHE_ENABLED:
+        return None
+    argv = "\x00".join(" ".join(command[:-1]) for command in commands)
+    subtitles_digest, _ = _canonical_vtt(vtt_path, _probe_duration(video_path))
+    key = hashlib.blake2b(
+        f"{_file_fingerprint(video_path)}|{subtitles_digest}|{argv}".encode("utf-8")
+    ).hexdigest()
+    ext = os.path.splitext(output_path)[1].lower() or ".mp4"
+    return os.path.join(BURN_CACHE_DIR, key[:2], key + ext)
+
+def _link_or_copy(src, dst):
+    # A fresh link (never in-place writes), so the cache entry and the output never alias a file being rewritten
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError: # Different filesystem, or links not supported
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+def _cache_fetch(cache_path, output_path):
+    if not cache_path or not os.path.exists(cache_path):
+        return False
+    try:
+        _link_or_copy(cache_path, output_path)
+        os.utime(cache_path) # Recently used: trimmed last
+    except OSError as e:
+        print(f"⚠️ Could not reuse cached output {cache_path}: {e}")
+        return False
+    print(f"♻️ Reused cached output for {output_path}.")
+    return True
+
+def _cache_store(output_path, cache_path):
+    if not cache_path:
+        return
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        _link_or_copy(output_path, cache_path)
+    except OSError as e:
+        print(f"⚠️ Could not cache output {output_path}: {e}")
+    _trim_cache()
+
+def _trim_cache(root=None, max_bytes=None):
+    """
+    Deletes the least recently used (oldest mtime) entries under root until it holds at most max_bytes.
+    Each overlay directory (see GPU SUBTITLE OVERLAY) counts as one entry. Defaults: _work_dir(), BURN_CACHE_MAX_BYTES.
+    Entries used less than BURN_CACHE_MIN_AGE seconds ago are never deleted.
+    """
+    root = root or _work_dir()
+    max_bytes = BURN_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    in_use_since = time.time() - BURN_CACHE_MIN_AGE
+    entries = [] # (mtime, size, path)
+    with _trim_lock:
+        for dirpath, dirnames, filenames in os.walk(root):
+            if os.path.basename(dirpath) == "overlays":
+                for name in dirnames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        files = [os.stat(os.path.join(path, f)) for f in os.listdir(path)]
+                        entries.append((os.stat(path).st_mtime, sum(st.st_size for st in files), path))
+                    except OSError:
+                        pass # Removed concurrently
+                dirnames.clear()
+            for name in filenames:
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, os.path.join(dirpath, name)))
+
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= max_bytes or mtime >= in_use_since:
+                break
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+def _touch(path):
+    # Recently used: trimmed last, and not at all while younger than BURN_CACHE_MIN_AGE
+    try:
+        os.utime(path)
+    except OSError:
+        pass # Trimmed by another process; the caller's next exists() check notices
+
+def _work_dir():
+    """
+    Where compiled subtitles and overlays are written: BURN_CACHE_DIR with the cache on, otherwise a temp
+    directory of this process (removed at exit).
+    """
+    global _scratch_dir
+    if BURN_CACHE_ENABLED:
+        return BURN_CACHE_DIR
+    with _trim_lock:
+        if _scratch_dir is None:
+            _scratch_dir = tempfile.mkdtemp(prefix="polysub-")
+            atexit.register(shutil.rmtree, _scratch_dir, ignore_errors=True)
+        return _scratch_dir
+
+def _unlink_output(output_path):
+    # ffmpeg -y truncates in place, which would also overwrite a cache entry hardlinked to an older output
+    if BURN_CACHE_ENABLED:
+        try:
+            os.unlink(output_path)
+        except OSError:
+            pass
+
+# --- CANONICAL SUBTITLES ---
+# What a burn draws depends only on the timed cue text, so caches key on a canonical form of the VTT:
+# no BOM, header, identifiers, NOTE/STYLE blocks or empty cues, whitespace collapsed within lines,
+# times rounded to 10 ms (ASS precision), cues after the end of the video dropped.
+
+# Cue timing line: "[HH:]MM:SS.mmm --> [HH:]MM:SS.mmm [settings]"
+_CUE_TIMING = re.compile(r"^\s*((?:\d+:)?\d{2}:\d{2}[.,]\d{3})\s+-->\s+((?:\d+:)?\d{2}:\d{2}[.,]\d{3})(.*)$")
+
+def _vtt_seconds(timestamp):
+    parts = timestamp.replace(",", ".").split(":")
+    seconds = int(parts[-2]) * 60 + float(parts[-1])
+    if len(parts) == 3:
+        seconds += int(parts[0]) * 3600
+    return seconds
+
+def _read_cues(vtt_path):
+    """
+    Streams the VTT. Returns [(start, end, settings, text_lines)] (long and short timestamp forms).
+    """
+    cues = []
+    cue = None
+    with open(vtt_path, encoding="utf-8-sig", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            match = _CUE_TIMING.match(line) if "-->" in line else None
+            if match:
+                cue = (_vtt_seconds(match.group(1)), _vtt_seconds(match.group(2)), match.group(3).strip(), [])
+                cues.append(cue)
+            elif cue is not None:
+                if line.strip():
+                    cue[3].append(line)
+                else:
+                    cue = None # Blank line closes the cue
+    return cues
+
+def _canonical_cues(vtt_path, duration=None):
+    """
+    The VTT's cues in canonical form (see above), clipped to duration if given: [(start, end, settings, text)].
+    """
+    cues = []
+    for start, end, settings, lines in _read_cues(vtt_path):
+        text = "\n".join(" ".join(line.split()) for line in lines if line.strip())
+        if duration is not None:
+            if start >= duration:
+                continue
+            end = min(end, duration)
+        start, end = round(start, 2), round(end, 2)
+        if text and end > start:
+            cues.append((start, end, " ".join(settings.split()), text))
+    return cues
+
+def _cue_block(start, end, settings, text):
+    return f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}{' ' + settings if settings else ''}\n{text}\n"
+
+def _canonical_vtt(vtt_path, duration=None):
+    """
+    Canonical form of the VTT (see above), clipped to duration if given. Returns (digest, canonical VTT text).
+    """
+    canonical = "\n".join(["WEBVTT\n", *(_cue_block(*cue) for cue in _canonical_cues(vtt_path, duration))])
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest(), canonical
+
+def _vtt_timestamp(seconds):
+    ms = int(round(seconds * 1000))
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    return f"{hours:02}:{minutes:02}:{ms // 1000:02}.{ms % 1000:03}"
+
+# --- COMPILED SUBTITLES ---
+# libass parses (and styles) the VTT in every ffmpeg process; converting it to ASS once and burning with
+# the ass filter skips that per invocation. The ASS is compiled from the canonical VTT and named by its digest,
+# so VTTs that draw the same thing share one file (and one output cache key).
+_ass_files = {} # (abs vtt path, mtime_ns, size, duration) -> compiled .ass path
+_ass_lock = threading.Lock()
+
+def _compile_to_ass(vtt_path, duration=None):
+    """
+    Converts the VTT (canonical form, clipped to duration) to ASS, once per file version.
+    Returns the .ass path, or None if ffmpeg can't convert it.
+    """
+    vtt_path = os.path.abspath(vtt_path)
+    st = os.stat(vtt_path)
+    memo_key = (vtt_path, st.st_mtime_ns, st.st_size, duration)
+    with _ass_lock:
+        # (Unless the compiled file was trimmed from the cache since)
+        if memo_key in _ass_files and (_ass_files[memo_key] is None or os.path.exists(_ass_files[memo_key])):
+            if _ass_files[memo_key]:
+                _touch(_ass_files[memo_key])
+            return _ass_files[memo_key]
+
+        digest, canonical = _canonical_vtt(vtt_path, duration)
+        ass_path = os.path.join(_work_dir(), "ass", digest + ".ass")
+        if os.path.exists(ass_path):
+            _touch(ass_path) # Compiled by an earlier process
+        else:
+            try:
+                os.makedirs(os.path.dirname(ass_path), exist_ok=True)
+                canonical_path = f"{ass_path[:-4]}.{os.getpid()}.vtt"
+                with open(canonical_path, "w", encoding="utf-8") as f:
+                    f.write(canonical)
+            except OSError as e:
+                print(f"⚠️ Could not write to {os.path.dirname(ass_path)}: {e}")
+                return None
+            tmp_path = f"{ass_path[:-4]}.{os.getpid()}.ass"
+            ok, error_msg = _run_ffmpeg(["ffmpeg", "-y", "-loglevel", "error", "-i", canonical_path, "-c:s", "ass", tmp_path])
+            os.unlink(canonical_path)
+            if not ok:
+                print(f"⚠️ Could not convert {vtt_path} to ASS, burning the VTT directly: {error_msg[-500:]}")
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass # ffmpeg failed before creating it
+                _ass_files[memo_key] = None
+                return None
+            os.replace(tmp_path, ass_path)
+
+        _ass_files[memo_key] = ass_path
+        return ass_path
+
+# --- GPU SUBTITLE OVERLAY (NVENC) ---
+# Even with NVENC the subtitles filter draws on system-memory frames: every decoded frame is downloaded from the GPU,
+# drawn on and uploaded again. Instead, each distinct on-screen state (the set of cues shown at once) is rasterized
+# once to a transparent PNG at the video's size, and the PNGs are played as a second input (concat demuxer, one entry
+# per interval) that overlay_cuda composites onto frames that stay on the GPU from decoder to encoder.
+# The PNGs are cached under _work_dir()/overlays, keyed by the canonical subtitles, style and size.
+# Set POLYSUB_GPU_OVERLAY=off to always draw on the CPU.
+GPU_OVERLAY_ENABLED = os.getenv("POLYSUB_GPU_OVERLAY", "on").lower() not in ("off", "0", "false")
+GPU_OVERLAY_FILTERS = ("overlay_cuda", "scale_cuda")
+_overlay_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=1)
+def _listed_filters():
+    """
+    Names of the filters compiled into ffmpeg (`ffmpeg -filters`, run once).
+    """
+    try:
+        result = subprocess.run([_which("ffmpeg"), "-hide_banner", "-filters"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return frozenset()
+    # Lines look like: " ... overlay_cuda      VV->V      Overlay one video on top of another using CUDA"
+    return frozenset(parts[1] for parts in map(str.split, result.stdout.splitlines()) if len(parts) > 2 and "->" in parts[2])
+
+def _overlay_timeline(cues, duration):
+    """
+    Splits [0, duration) into intervals showing the same cues: [(start, end, state)], state the tuple of
+    (settings, text) of the visible cues in file order (() when nothing is shown).
+    """
+    # At equal times ends sort before starts, so back-to-back cues don't share an interval
+    events = sorted(itertools.chain(
+        ((start, 1, i) for i, (start, _, _, _) in enumerate(cues)),
+        ((end, 0, i) for i, (_, end, _, _) in enumerate(cues)),
+    ))
+    timeline = []
+    active = set()
+    position = 0.0
+    for time, is_start, i in events:
+        if time > position:
+            state = tuple(cues[j][2:] for j in sorted(active))
+            if timeline and timeline[-1][2] == state:
+                timeline[-1] = (timeline[-1][0], time, state)
+            else:
+                timeline.append((position, time, state))
+            position = time
+        (active.add if is_start else active.discard)(i)
+    if position < duration:
+        timeline.append((position, duration, ()))
+    return timeline
+
+def _gpu_overlay(video_path, vtt_path, duration, target_language=None, subtitle_color=None):
+    """
+    Rasterizes the VTT's on-screen states (see above) and writes their concat list, once per subtitles/style/size.
+    Returns the list's path, or None if the GPU overlay is off or unavailable, or there is nothing to draw.
+    """
+    if not GPU_OVERLAY_ENABLED or not set(GPU_OVERLAY_FILTERS) <= _listed_filters():
+        return None
+    size = _probe_size(video_path)
+    cues = _canonical_cues(vtt_path, duration)
+    if not size or not cues:
+        return None
+
+    digest, _ = _canonical_vtt(vtt_path, duration)
+    key = hashlib.blake2b(f"{digest}|{target_language}|{subtitle_color}|{size[0]}x{size[1]}".encode("utf-8")).hexdigest()[:32]
+    overlay_dir = os.path.join(_work_dir(), "overlays", key)
+    list_path = os.path.join(overlay_dir, "list.ffconcat")
+    with _overlay_lock:
+        if os.path.exists(list_path):
+            _touch(overlay_dir)
+            return list_path
+
+        timeline = _overlay_timeline(cues, duration)
+        slots = {(): 0} # state -> PNG number (0: blank)
+        for _, _, state in timeline:
+            slots.setdefault(state, len(slots))
+        try:
+            os.makedirs(os.path.dirname(overlay_dir), exist_ok=True)
+            build_dir = tempfile.mkdtemp(dir=os.path.dirname(overlay_dir))
+        except OSError as e:
+            print(f"⚠️ Could not write to {os.path.dirname(overlay_dir)}: {e}")
+            return None
+
+        # One ffmpeg run draws every state: state i is shown from second i of a transparent 1 fps clip
+        atlas_path = os.path.join(build_dir, "atlas.vtt")
+        with open(atlas_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(["WEBVTT\n", *(
+                _cue_block(number, number + 0.99, settings, text) for state, number in slots.items() for settings, text in state
+            )]))
+        ok, error_msg = _run_ffmpeg([
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"color=c=black@0.0:s={size[0]}x{size[1]}:r=1:d={len(slots)}",
+            "-vf", "format=rgba," + _subtitles_filter(atlas_path, target_language, subtitle_color),
+            "-start_number", "0", os.path.join(build_dir, "slot_%05d.png")
+        ])
+        if not ok:
+            print(f"⚠️ Could not rasterize subtitles for the GPU overlay, drawing them on the CPU: {error_msg[-500:]}")
+            shutil.rmtree(build_dir, ignore_errors=True)
+            return None
+
+        lines = ["ffconcat version 1.0"]
+        for start, end, state in timeline:
+            lines += [f"file slot_{slots[state]:05d}.png", f"duration {end - start:.3f}"]
+        lines.append("file slot_00000.png") # The concat demuxer ignores the last entry's duration
+        with open(os.path.join(build_dir, "list.ffconcat"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.unlink(atlas_path)
+        try:
+            os.replace(build_dir, overlay_dir)
+        except OSError: # Another process finished the same overlay first
+            shutil.rmtree(build_dir, ignore_errors=True)
+    _trim_cache()
+    return list_path
+
+# Soft subtitle codec per output container (everything else gets mov_text, like .mp4)
+SOFT_SUBTITLE_CODECS = {
+    ".mp4": "mov_text",
+    ".m4v": "mov_text",
+    ".mov": "mov_text",
+    ".mkv": "webvtt",
+    ".webm": "webvtt",
+}
+
+# Containers that take -movflags +faststart (index moved to the front: playback starts before the download ends)
+FASTSTART_EXTS = (".mp4", ".m4v", ".mov")
+
+def _faststart_args(output_path, faststart=None):
+    # faststart: None = automatic (by the output extension), True/False to force
+    if faststart is None:
+        faststart = os.path.splitext(output_path)[1].lower() in FASTSTART_EXTS
+    return ["-movflags", "+faststart"] if faststart else []
+
+def _stream_map_args(video_path, output_path, keep_streams=True, video_map=None):
+    """
+    Input streams kept in a burned output: every video (not cover art) and audio stream.
+    keep_streams="all": also subtitle and data streams (copied) when the output container is the input's (across
+    containers they often can't be copied). Opt-in: the muxer rejects some data tracks even then (tmcd, mebx, gpmd
+    from phones and action cameras). keep_streams=False: ffmpeg's default selection (one stream per type).
+    video_map: the video to map instead (e.g. a -filter_complex output label).
+    """
+    if not keep_streams:
+        return ["-map", video_map, "-map", "0:a:0?"] if video_map else []
+    args = ["-map", video_map or "0:V", "-map", "0:a?"]
+    if keep_streams == "all" and os.path.splitext(video_path)[1].lower() == os.path.splitext(output_path)[1].lower():
+        args += ["-map", "0:s?", "-map", "0:d?", "-c:s", "copy", "-c:d", "copy"]
+    return args
+
+def _inputs_exist(video_path, vtt_path):
+    if not os.path.exists(video_path):
+        print(f"❌ Error: Video file not found: {video_path}")
+        return False
+    if not os.path.exists(vtt_path):
+        print(f"❌ Error: Subtitle file not found: {vtt_path}")
+        return False
+    return True
+
+def _probe_duration(video_path):
+    """
+    Container duration in seconds (None if ffprobe can't tell). Probed once per file version.
+    """
+    st = os.stat(video_path)
+    return _probe_duration_cached(os.path.abspath(video_path), st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=256)
+def _probe_duration_cached(video_path, mtime_ns, size):
+    try:
+        result = subprocess.run(
+            [_which("ffprobe"), "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", video_path],
+            capture_output=True, text=True, check=True
+        )
+        return float(result.stdout.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+def _probe_height(video_path):
+    size = _probe_size(video_path)
+    return size[1] if size else None
+
+def _probe_size(video_path):
+    """
+    (width, height) of the first video stream (None if ffprobe can't tell). Probed once per file version.
+    """
+    st = os.stat(video_path)
+    return _probe_size_cached(os.path.abspath(video_path), st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=256)
+def _probe_size_cached(video_path, mtime_ns, size):
+    try:
+        result = subprocess.run(
+            [_which("ffprobe"), "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height", "-of", "csv=p=0", video_path],
+            capture_output=True, text=True, check=True
+        )
+        width, height = result.stdout.split()[0].strip(",").split(",")[:2]
+        return int(width), int(height)
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+        return None
+
+def _nothing_to_burn(video_path, vtt_path):
+    """
+    True if no cue with text falls inside the video (empty or mistimed VTT, likely the wrong file):
+    the output would look like the input, so a stream copy replaces the encode.
+    """
+    cues = [(start, end) for start, end, _, lines in _read_cues(vtt_path) if lines]
+    if not cues or max(end for _, end in cues) < 0.1:
+        print(f"⚠️ {vtt_path} has no timed cues, copying the video without burning.")
+        return True
+    duration = _probe_duration(video_path)
+    if duration is not None and min(start for start, _ in cues) >= duration:
+        print(f"⚠️ All cues in {vtt_path} start after the end of the video ({duration:.1f}s), copying it without burning.")
+        return True
+    return False
+
+def _copy_video(video_path, output_path, keep_streams=True):
+    ok, error_msg = _run_ffmpeg(_copy_command(video_path, output_path, keep_streams))
+    if ok:
+        return os.path.abspath(output_path)
+    print(f"❌ Error copying video: {error_msg}")
+    return None
+
+def _copy_command(video_path, output_path, keep_streams=True):
+    # Same streams as a burned output: -map 0 would also take data tracks the muxer rejects (tmcd, mebx, gpmd)
+    return [
+        "ffmpeg", "-y", "-i", os.path.abspath(video_path), *_stream_map_args(video_path, output_path, keep_streams), "-c", "copy",
+        *_faststart_args(output_path), os.path.abspath(output_path)
+    ]
+
+def mux_subtitles(video_path, vtt_path, output_path, language=None, title=None):
+    """
+    Adds the VTT as a soft subtitle track (player-toggleable) without re-encoding:
+    video and audio are stream-copied, so this runs at disk speed and is lossless.
+    
+    Args:
+        language (str): Optional. ISO 639-2 code stored as the track language (e.g. "por").
+        title (str): Optional. Track title shown by players (e.g. "Portuguese").
+        
+    Returns:
+        str: Path to the output video file if successful, None otherwise.
+    """
+    if not _inputs_exist(video_path, vtt_path):
+        return None
+
+    ok, error_msg = _run_ffmpeg(_mux_command(video_path, vtt_path, output_path, language, title))
+    if ok:
+        print("✅ Subtitles muxed successfully (soft track).")
+        return os.path.abspath(output_path)
+    print(f"❌ Error muxing subtitles: {error_msg}")
+    return None
+
+def _mux_command(video_path, vtt_path, output_path, language=None, title=None):
+    subtitle_codec = SOFT_SUBTITLE_CODECS.get(os.path.splitext(output_path)[1].lower(), "mov_text")
+    metadata = []
+    if language:
+        metadata += ["-metadata:s:s:0", f"language={language}"]
+    if title:
+        metadata += ["-metadata:s:s:0", f"title={title}"]
+
+    return [
+        "ffmpeg",
+        "-y", # Overwrite output file
+        "-i", os.path.abspath(video_path),
+        "-i", os.path.abspath(vtt_path),
+        "-map", "0:v", "-map", "0:a?", "-map", "1:s",
+        "-c", "copy",
+        "-c:s", subtitle_codec,
+        *metadata,
+        *_faststart_args(output_path),
+        os.path.abspath(output_path)
+    ]
+
+def burn_subtitles(video_path, vtt_path, output_path, target_language=None, subtitle_color=None, hwaccel="auto", burn=True,
+                   keep_streams=True, faststart=None, preset=None, crf=None, progress_cb=None):
     """
     Burns VTT subtitles into a video file using ffmpeg.
     
     Args:
-        video_path (str): Path to the input video file.
+        video_path (str): Path to the input video file. Also a named pipe, a readable file descriptor (int)
+            or a file object with fileno() to stream from an upstream producer without an intermediate file
+            (the stream must be readable front to back: MPEG-TS, Matroska or fragmented MP4).
         vtt_path (str): Path to the VTT subtitle file.
         output_path (str): Path to save the output video file.
         target_language (str): Optional. Target language of the subtitles.
         subtitle_color (str): Optional. ASS Subtitle Color hex code.
+        hwaccel (str): Optional. "auto" (default) picks a working GPU encoder (NVENC/QSV/VAAPI),
+            "nvenc"/"qsv"/"vaapi" requests one, None or "none" forces software (libx264).
+        burn (bool): Optional. False adds a soft subtitle track instead (no re-encode, see mux_subtitles).
+        keep_streams (bool or str): Optional. Keep all video/audio streams (default). "all": also copy subtitle/data
+            streams when the container doesn't change. False: ffmpeg's default stream selection.
+        faststart (bool): Optional. -movflags +faststart; None (default) = for .mp4/.m4v/.mov outputs.
+        preset (str): Optional. libx264 preset for software encoding; None (default) = veryfast up to 1080p, fast above;
+            one step faster for videos longer than X264_LONG_SECONDS.
+        crf (int): Optional. libx264 CRF for software encoding (default X264_CRF).
+        progress_cb (callable): Optional. Called with each ffmpeg -progress block as a dict of strings
+            (frame, fps, out_time_ms, speed, ..., progress="continue" or "end").
         
     Returns:
         str: Path to the output video file if successful, None otherwise.
     """
-    if not os.path.exists(video_path):
-        print(f"❌ Error: Video file not found: {video_path}")
+    stream_input = _stream_input(video_path)
+    if stream_input:
+        return _burn_stream(
+            stream_input, vtt_path, output_path, target_language, subtitle_color, hwaccel, burn,
+            keep_streams, faststart, preset, crf, progress_cb
+        )
+
+    if not _inputs_exist(video_path, vtt_path):
         return None
+
+    if not burn:
+        return mux_subtitles(video_path, vtt_path, output_path, title=target_language)
+
+    if _nothing_to_burn(video_path, vtt_path):
+        return _copy_video(video_path, output_path, keep_streams)
+
+    commands = _burn_commands(
+        video_path, vtt_path, output_path, target_language, subtitle_color, hwaccel, _threads_per_invocation(1),
+        keep_streams, faststart, preset, crf
+    )
+    cache_path = _burn_cache_path(video_path, vtt_path, commands, output_path)
+    if _cache_fetch(cache_path, output_path):
+        return os.path.abspath(output_path)
+
+    _unlink_output(output_path)
+    for attempt, command in enumerate(commands):
+        ok, error_msg = _run_ffmpeg(command, progress_cb=progress_cb)
+        if ok:
+            print("✅ Subtitles burned successfully.")
+            _cache_store(output_path, cache_path)
+            return os.path.abspath(output_path)
+        if attempt + 1 < len(commands):
+            print(f"⚠️ Hardware encode failed, retrying with the next fallback: {error_msg[-500:]}")
+    print(f"❌ Error burning subtitles: {error_msg}")
+    return None
+
+async def burn_subtitles_async(video_path, vtt_path, output_path, target_language=None, subtitle_color=None, hwaccel="auto",
+                                burn=True, keep_streams=True, faststart=None, preset=None, crf=None, progress_cb=None):
+    """
+    burn_subtitles as a coroutine: ffmpeg runs as an asyncio subprocess, so many burns can run concurrently
+    in one event loop without a thread each. Same arguments and return value as burn_subtitles.
+    """
+    if _stream_input(video_path):
+        return await asyncio.to_thread(
+            burn_subtitles, video_path, vtt_path, output_path, target_language, subtitle_color, hwaccel, burn,
+            keep_streams, faststart, preset, crf, progress_cb
+        )
+
+    job = {
+        "video_path": video_path, "vtt_path": vtt_path, "output_path": output_path,
+        "target_language": target_language, "subtitle_color": subtitle_color, "hwaccel": hwaccel, "burn": burn,
+        "keep_streams": keep_streams, "faststart": faststart, "preset": preset, "crf": crf,
+    }
+    # Input checks, probes and the ASS conversion block: keep them off the event loop
+    plan = await asyncio.to_thread(_job_plan, job, _threads_per_invocation(1))
+    result = await _run_plan(output_path, plan, contextlib.nullcontext(), progress_cb)
+    if result:
+        print(f"✅ Subtitles {'burned' if burn else 'muxed'} successfully.")
+    return result
+
+def _stream_input(video_path):
+    """
+    For a pipe input (fd, file object, named pipe): (path ffmpeg reads, fds the child must inherit). None for a file.
+    """
+    if hasattr(video_path, "fileno"):
+        video_path = video_path.fileno()
+    if isinstance(video_path, int):
+        return f"/dev/fd/{video_path}", (video_path,)
+    try:
+        if stat.S_ISFIFO(os.stat(video_path).st_mode):
+            return os.path.abspath(video_path), ()
+    except OSError:
+        pass
+    return None
+
+def _burn_stream(stream_input, vtt_path, output_path, target_language=None, subtitle_color=None, hwaccel="auto", burn=True,
+                 keep_streams=True, faststart=None, preset=None, crf=None, progress_cb=None):
+    """
+    burn_subtitles for a pipe input. The stream can be read only once, so there is no probing (no early exit,
+    preset defaults to veryfast), no output cache and no software retry after a failed hardware encode.
+    """
+    input_path, pass_fds = stream_input
     if not os.path.exists(vtt_path):
         print(f"❌ Error: Subtitle file not found: {vtt_path}")
         return None
 
+    if burn:
+        command = _burn_commands(
+            input_path, vtt_path, output_path, target_language, subtitle_color, hwaccel, _threads_per_invocation(1),
+            keep_streams, faststart, preset or "veryfast", crf
+        )[0]
+    else:
+        command = _mux_command(input_path, vtt_path, output_path, title=target_language)
+    # Start decoding as soon as data arrives instead of buffering the stream for analysis first
+    i = command.index("-i")
+    command[i:i] = ["-fflags", "+nobuffer", "-flags", "low_delay"]
+
+    _unlink_output(output_path)
+    ok, error_msg = _run_ffmpeg(command, pass_fds, progress_cb)
+    if ok:
+        print(f"✅ Subtitles {'burned' if burn else 'muxed'} successfully (streamed input).")
+        return os.path.abspath(output_path)
+    print(f"❌ Error burning subtitles: {error_msg}")
+    return None
+
+def _burn_commands(video_path, vtt_path, output_path, target_language=None, subtitle_color=None, hwaccel="auto", threads=None,
+                   keep_streams=True, faststart=None, preset=None, crf=None, gpu_overlay=True):
+    """
+    Builds the burn-in ffmpeg command(s) to try in order: the GPU overlay (NVENC only, see above), the hardware
+    encode (if any), then software.
+    threads: ffmpeg threads per process (None = ffmpeg default).
+    gpu_overlay: False skips the GPU overlay command.
+    """
     # Use absolute paths to avoid issues with CWD or filters
     video_path = os.path.abspath(video_path)
-    vtt_path = os.path.abspath(vtt_path)
     output_path = os.path.abspath(output_path)
 
-    # Escape paths for ffmpeg filter
-    # On Windows, we need to handle backslashes carefully for the filter string
-    # Replace backslashes with forward slashes is usually safer for ffmpeg filters on Windows
-    vtt_path_filter = vtt_path.replace("\\", "/").replace(":", "\\:")
+    # A pipe input can be read only once: no probing it
+    duration = None if _stream_input(video_path) else _probe_duration(video_path)
+    subtitles_filter = _subtitles_filter(vtt_path, target_language, subtitle_color, duration=duration)
+    hw = select_hwaccel(hwaccel)
+    map_args = _stream_map_args(video_path, output_path, keep_streams)
+    output_args = _faststart_args(output_path, faststart)
+    x264_args = _x264_args(video_path, preset, crf)
+
+    commands = [_build_burn_command(video_path, subtitles_filter, output_path, hw, threads, map_args, output_args, x264_args)]
+    if hw:
+        commands.append(_build_burn_command(video_path, subtitles_filter, output_path, None, threads, map_args, output_args, x264_args))
+    overlay_list = None
+    if hw == "nvenc" and duration and gpu_overlay:
+        overlay_list = _gpu_overlay(video_path, vtt_path, duration, target_language, subtitle_color)
+    if overlay_list:
+        overlay_map_args = _stream_map_args(video_path, output_path, keep_streams, video_map="[v]")
+        commands.insert(0, _build_overlay_command(video_path, overlay_list, output_path, threads, overlay_map_args, output_args))
+    return commands
+
+def _subtitles_filter(vtt_path, target_language=None, subtitle_color=None, duration=None):
+    """
+    The filter (ass=... or subtitles=...) that draws the subtitles, with the language's fallback font and the color.
+    duration: the video's, if known (cues past it are left out of the compiled ASS).
+    """
+    vtt_path = os.path.abspath(vtt_path)
+
+    # Burn the compiled ASS if the conversion works (same rendering, no VTT parsing per invocation)
+    ass_path = _compile_to_ass(vtt_path, duration)
+    subtitle_path = ass_path or vtt_path
 
     # Determine fallback font style for CJK languages to avoid white squares
     force_styles = []
@@ -62,36 +870,490 @@ def burn_subtitles(video_path, vtt_path, output_path, target_language=None, subt
     if subtitle_color:
         force_styles.append(f"PrimaryColour={subtitle_color}")
         
-    font_style = ""
+    filename = _ffmpeg_filter_escape(subtitle_path)
+    if ass_path and not force_styles:
+        return f"ass=filename={filename}"
+    # The ass filter has no force_style; the subtitles filter applies it (and reads ASS just as well)
+    subtitles_filter = f"subtitles=filename={filename}"
     if force_styles:
-        font_style = f":force_style='{','.join(force_styles)}'"
+        subtitles_filter += f":force_style={_ffmpeg_filter_escape(','.join(force_styles))}"
+    return subtitles_filter
+
+# ffmpeg parses a filter option value twice: as a filter option (\ ' : are special), then as part of the
+# filtergraph description (\ ' [ ] , ; are special). Each level escapes with a backslash.
+_FILTER_OPTION_SPECIAL = re.compile(r"([\\':])")
+_FILTERGRAPH_SPECIAL = re.compile(r"([\\'\[\],;])")
 
+def _ffmpeg_filter_escape(value, graph=True):
+    """
+    Escapes a filter option value (e.g. a path) so ffmpeg reads it back verbatim: drive letters, quotes,
+    commas and brackets included. graph=False: only the option level (for a filter added on its own).
+    """
+    value = _FILTER_OPTION_SPECIAL.sub(r"\\\1", value)
+    if graph:
+        value = _FILTERGRAPH_SPECIAL.sub(r"\\\1", value)
+    return value
+
+def _build_burn_command(video_path, subtitles_filter, output_path, hw=None, threads=None, map_args=(), output_args=(), x264_args=()):
     # Construct the ffmpeg command
     # -i input_video -vf "subtitles=filename:force_style='Fontname=Fallback'" -c:a copy output_video
-    # we prefer libx264 for compatibility, but user didn't specify. 
+    # Software: libx264 with x264_args (ffmpeg's default encoder settings if empty). Hardware: decode on the GPU where possible
+    # (-hwaccel cuda), draw subtitles on CPU frames, upload and encode on the GPU.
     # Let's try to just act on the video stream and copy audio to be fast.
-    command = [
+    hwaccel_args = ["-hwaccel", "cuda"] if hw == "nvenc" else []
+    # -threads before -i caps the decoder, after -vf the encoder (both on purpose); -filter_threads the filter graph
+    thread_args = ["-threads", str(threads)] if threads else []
+    filter_thread_args = ["-filter_threads", str(threads)] if threads else []
+    return [
         "ffmpeg",
         "-y", # Overwrite output file
+        *_hw_device_args(hw),
+        *filter_thread_args,
+        *hwaccel_args,
+        *thread_args,
         "-i", video_path,
-        "-vf", f"subtitles='{vtt_path_filter}'{font_style}",
+        *map_args,
+        "-vf", subtitles_filter + _hw_filter_suffix(hw),
+        *thread_args,
+        *(_hw_encoder_args(hw) if hw else x264_args),
         "-c:a", "copy",
+        *output_args,
         output_path
     ]
 
+def _build_overlay_command(video_path, overlay_list, output_path, threads=None, map_args=(), output_args=()):
+    # NVENC with the subtitles composited on the GPU: frames decoded into CUDA memory (-hwaccel_output_format cuda),
+    # the rasterized cues (overlay_list) uploaded once per change, overlay_cuda, then encoded without leaving the GPU.
+    # scale_cuda converts the decoded frames (nv12, p010...) to the yuv420p overlay_cuda blends onto.
+    thread_args = ["-threads", str(threads)] if threads else []
+    filter_thread_args = ["-filter_threads", str(threads)] if threads else []
+    return [
+        "ffmpeg",
+        "-y",
+        "-init_hw_device", "cuda=gpu", "-filter_hw_device", "gpu",
+        *filter_thread_args,
+        "-hwaccel", "cuda", "-hwaccel_device", "gpu", "-hwaccel_output_format", "cuda",
+        *thread_args,
+        "-i", video_path,
+        "-f", "concat", "-i", overlay_list,
+        "-filter_complex",
+        "[0:V:0]scale_cuda=format=yuv420p[main];[1:v]format=yuva420p,hwupload[subs];"
+        "[main][subs]overlay_cuda=eof_action=repeat[v]",
+        *map_args,
+        *thread_args,
+        *_hw_encoder_args("nvenc"),
+        "-c:a", "copy",
+        *output_args,
+        output_path
+    ]
+
+# ffmpeg's log goes to a temp file (never a pipe: a chatty encode can fill it and stall the process);
+# only this much of its tail is read back, on failure
+STDERR_TAIL_BYTES = 4096
+
+def _read_tail(log_file):
+    log_file.seek(0, os.SEEK_END)
+    log_file.seek(max(0, log_file.tell() - STDERR_TAIL_BYTES))
+    return log_file.read().decode('utf-8', 'replace')
+
+def _progress_args(progress_cb):
+    # Machine-readable progress on stdout (key=value lines, each block ending with progress=...); no stats line
+    # and only errors in the log
+    return ["-progress", "pipe:1", "-nostats", "-loglevel", "error"] if progress_cb else []
+
+def _feed_progress(line, block, progress_cb):
+    key, _, value = line.decode("utf-8", "replace").strip().partition("=")
+    if not key:
+        return
+    block[key] = value
+    if key == "progress":
+        try:
+            progress_cb(dict(block))
+        except Exception as e: # A broken progress display must not abort the encode
+            print(f"⚠️ progress_cb failed: {e}")
+        block.clear()
+
+def _run_ffmpeg(command, pass_fds=(), progress_cb=None):
+    """
+    Runs an ffmpeg command. Returns (success, error_message).
+    pass_fds: file descriptors ffmpeg inherits (pipe inputs read as /dev/fd/N).
+    progress_cb: called with each progress block (see burn_subtitles).
+    """
     print(f"🎬 Running ffmpeg command: {' '.join(command)}")
 
-    try:
+    with tempfile.TemporaryFile() as log_file:
         # Run ffmpeg
-        result = subprocess.run(
-            command,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+        proc = subprocess.Popen(
+            [_which(command[0]), *_progress_args(progress_cb), *command[1:]],
+            stdout=subprocess.PIPE if progress_cb else subprocess.DEVNULL, stderr=log_file, close_fds=True, pass_fds=pass_fds
         )
-        print("✅ Subtitles burned successfully.")
-        return output_path
-    except subprocess.CalledProcessError as e:
-        error_msg = e.stderr.decode('utf-8')
-        print(f"❌ Error burning subtitles: {error_msg}")
+        if progress_cb:
+            block = {}
+            with proc.stdout:
+                for line in proc.stdout:
+                    _feed_progress(line, block, progress_cb)
+        if proc.wait() == 0:
+            return True, ""
+        return False, _read_tail(log_file)
+
+# --- BATCH BURN-IN ---
+# Many clips: ffmpeg processes run concurrently (bounded), overlapping process start-up, I/O and encoding.
+BATCH_THREADS_PER_JOB = 4 # Roughly the cores one software encode keeps busy; sizes the default concurrency
+
+def burn_subtitles_batch(jobs, max_concurrent=None, progress_cb=None):
+    """
+    Burns subtitles for many videos with at most max_concurrent ffmpeg processes at a time
+    (scheduled by BurnQueue: smallest videos first, paused while the machine is overloaded).
+    
+    Args:
+        jobs (list): dicts of burn_subtitles keyword arguments
+            (video_path, vtt_path, output_path, and optionally target_language, subtitle_color, hwaccel, burn,
+            keep_streams, faststart, preset, crf;
+            cache=False keeps the output out of the output cache, copy_if_empty=False always encodes,
+            fallback=False runs only the first command (no retry on another encoder), gpu_overlay=False skips
+            the GPU overlay).
+        max_concurrent (int): Optional. Defaults to cpu_count // BATCH_THREADS_PER_JOB (at least 1).
+            Each ffmpeg process is capped to cpu_count // max_concurrent threads.
+        progress_cb (callable): Optional. Called with (output_path, progress block) for every job
+            (blocks as in burn_subtitles).
+        
+    Returns:
+        list: per job, the output path if successful, None otherwise (same order as jobs).
+    """
+    if max_concurrent is None:
+        max_concurrent = max(1, (os.cpu_count() or 1) // BATCH_THREADS_PER_JOB)
+
+    print(f"🎬 Burning subtitles for {len(jobs)} videos ({max_concurrent} at a time)...")
+    results = asyncio.run(_run_batch(jobs, max_concurrent, progress_cb))
+
+    outputs = []
+    for job, result in zip(jobs, results):
+        if isinstance(result, Exception):
+            print(f"❌ Error burning subtitles for {job['video_path']}: {result}")
+            result = None
+        outputs.append(result)
+    print(f"✅ Batch complete: {sum(1 for r in outputs if r)}/{len(jobs)} succeeded.")
+    return outputs
+
+async def _run_batch(jobs, max_concurrent, progress_cb=None):
+    async with BurnQueue(max_concurrent, progress_cb) as queue:
+        return await asyncio.gather(*[queue.submit(job) for job in jobs], return_exceptions=True)
+
+def _job_plan(job, threads=None):
+    """
+    (commands to try in order, output cache path or None) for a batch job, or None if an input is missing.
+    """
+    if not _inputs_exist(job["video_path"], job["vtt_path"]):
         return None
+    if job.get("burn", True) and job.get("copy_if_empty", True) and _nothing_to_burn(job["video_path"], job["vtt_path"]):
+        return [_copy_command(job["video_path"], job["output_path"], job.get("keep_streams", True))], None
+    if not job.get("burn", True):
+        return [_mux_command(job["video_path"], job["vtt_path"], job["output_path"], title=job.get("target_language"))], None
+
+    commands = _burn_commands(
+        job["video_path"], job["vtt_path"], job["output_path"],
+        job.get("target_language"), job.get("subtitle_color"), job.get("hwaccel", "auto"), threads,
+        job.get("keep_streams", True), job.get("faststart"), job.get("preset"), job.get("crf"), job.get("gpu_overlay", True)
+    )
+    if not job.get("fallback", True):
+        commands = commands[:1]
+    cache_path = _burn_cache_path(job["video_path"], job["vtt_path"], commands, job["output_path"]) if job.get("cache", True) else None
+    return commands, cache_path
+
+# Back-pressure: BurnQueue starts no new ffmpeg process while the 1-minute load average, minus the load of its own
+# processes (max_workers * threads: the average still counts a process for a while after it exits), is above
+# LOAD_LIMIT * cpu_count (it never waits while none of its own is running, so the queue always moves).
+# Only other work on the machine holds it back: a queue that saturates the CPU by itself still refills its slots.
+LOAD_LIMIT = 0.9
+LOAD_POLL_SECONDS = 2
+
+def _overloaded(own_load=0):
+    try:
+        return os.getloadavg()[0] - own_load > (os.cpu_count() or 1) * LOAD_LIMIT
+    except (AttributeError, OSError): # No load average (Windows)
+        return False
+
+class BurnQueue:
+    """
+    Async scheduler for a stream of burn jobs: max_workers workers share one priority queue (smallest
+    priority first; by default the video's file size, so short clips don't wait behind long ones),
+    and new processes wait while the machine is overloaded.
+
+        async with BurnQueue(4) as queue:
+            outputs = await asyncio.gather(*[queue.submit(job) for job in jobs])
+
+    Jobs are burn_subtitles_batch job dicts; each future resolves to the output path, or None on failure.
+    """
+
+    def __init__(self, max_workers=None, progress_cb=None):
+        if max_workers is None:
+            max_workers = max(1, (os.cpu_count() or 1) // BATCH_THREADS_PER_JOB)
+        self.max_workers = max_workers
+        self.progress_cb = progress_cb # (output_path, progress block), as in burn_subtitles_batch
+        self._threads = _threads_per_invocation(max_workers)
+        self._queue = asyncio.PriorityQueue()
+        self._order = itertools.count() # Ties: first submitted, first run (jobs themselves aren't comparable)
+        self._workers = []
+        self._running = 0
+
+    def submit(self, job, priority=None):
+        """
+        Queues a job (call from the event loop). Returns an asyncio.Future of its result.
+        """
+        if priority is None:
+            try:
+                priority = os.path.getsize(job["video_path"])
+            except OSError:
+                priority = 0
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._order), job, future))
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+        return future
+
+    async def join(self):
+        """
+        Waits until every submitted job is done.
+        """
+        await self._queue.join()
+
+    async def close(self):
+        await self.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _worker(self):
+        while True:
+            _, _, job, future = await self._queue.get()
+            try:
+                # Input checks, probes and the ASS conversion block: keep them off the event loop
+                plan = await asyncio.to_thread(_job_plan, job, self._threads)
+                progress_cb = functools.partial(self.progress_cb, job["output_path"]) if self.progress_cb else None
+                result = await _run_plan(job["output_path"], plan, self._slot(), progress_cb)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        while self._running and _overloaded(self.max_workers * (self._threads or 1)):
+            await asyncio.sleep(LOAD_POLL_SECONDS)
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+
+async def _run_plan(output_path, plan, slot, progress_cb=None):
+    """
+    Runs a job plan: a cache hit needs no slot; otherwise the commands run inside slot (an async context manager).
+    progress_cb: called with each progress block.
+    """
+    if not plan:
+        return None
+    commands, cache_path = plan
+    if _cache_fetch(cache_path, output_path):
+        return os.path.abspath(output_path)
+
+    async with slot:
+        if cache_path:
+            _unlink_output(output_path)
+        for attempt, command in enumerate(commands):
+            ok, error_msg = await _run_ffmpeg_async(command, progress_cb)
+            if ok:
+                _cache_store(output_path, cache_path)
+                return os.path.abspath(output_path)
+            if attempt + 1 < len(commands):
+                print(f"⚠️ Hardware encode failed for {output_path}, retrying with the next fallback.")
+    print(f"❌ Error burning subtitles for {output_path}: {error_msg[-2000:]}")
+    return None
+
+async def _run_ffmpeg_async(command, progress_cb=None):
+    """
+    Async variant of _run_ffmpeg (no thread per process). Returns (success, error_message).
+    """
+    with tempfile.TemporaryFile() as log_file:
+        proc = await asyncio.create_subprocess_exec(
+            _which(command[0]), *_progress_args(progress_cb), *command[1:],
+            stdout=asyncio.subprocess.PIPE if progress_cb else asyncio.subprocess.DEVNULL, stderr=log_file
+        )
+        if progress_cb:
+            block = {}
+            async for line in proc.stdout:
+                _feed_progress(line, block, progress_cb)
+        if await proc.wait() == 0:
+            return True, ""
+        return False, _read_tail(log_file)
+
+
+# --- PARALLEL BURN-IN (single long video) ---
+# One ffmpeg process doesn't keep many cores busy (the subtitles filter is serial), so long videos are cut at
+# keyframes (stream copy), the chunks burned concurrently by the batch pool, and the results concatenated (stream copy).
+# Chunks are concatenated as they are, so all of them must come out of the same encoder with the same settings:
+# the encoder is resolved once, no chunk falls back to another one (the whole video is burned in one piece instead)
+# and none takes the GPU overlay (a chunk without cues has no overlay and would be encoded differently).
+PARALLEL_MIN_SECONDS = 60 # Shorter videos aren't worth the split/concat overhead
+# A GPU has one or two encoder engines (and NVENC a driver cap on sessions): more concurrent chunks only time-slice them
+PARALLEL_MAX_HW_CHUNKS = int(os.getenv("POLYSUB_PARALLEL_MAX_HW_CHUNKS", "2"))
+
+def burn_subtitles_parallel(video_path, vtt_path, output_path, n_chunks=None, target_language=None, subtitle_color=None, hwaccel="auto",
+                            keep_streams=True, faststart=None, preset=None, crf=None, progress_cb=None):
+    """
+    burn_subtitles for a single long video, encoding n_chunks keyframe-aligned segments in parallel.
+    Falls back to burn_subtitles for short videos or if splitting fails.
+    
+    Args:
+        n_chunks (int): Optional. Defaults to cpu_count // BATCH_THREADS_PER_JOB. At most PARALLEL_MAX_HW_CHUNKS
+            are encoded at a time on a hardware encoder.
+        target_language, subtitle_color, hwaccel, keep_streams, faststart, preset, crf: as in burn_subtitles.
+        progress_cb (callable): Optional. Called with (path, progress block): the chunk's output path while the chunks
+            encode, output_path if the video isn't split (blocks as in burn_subtitles).
+        
+    Returns:
+        str: Path to the output video file if successful, None otherwise.
+    """
+    if not _inputs_exist(video_path, vtt_path):
+        return None
+    if n_chunks is None:
+        n_chunks = max(1, (os.cpu_count() or 1) // BATCH_THREADS_PER_JOB)
+    whole_progress_cb = functools.partial(progress_cb, output_path) if progress_cb else None # Unsplit fallbacks
+    if _nothing_to_burn(video_path, vtt_path):
+        return _copy_video(video_path, output_path, keep_streams)
+
+    duration = _probe_duration(video_path)
+    if n_chunks < 2 or not duration or duration <= PARALLEL_MIN_SECONDS:
+        return burn_subtitles(
+            video_path, vtt_path, output_path, target_language, subtitle_color, hwaccel, True,
+            keep_streams, faststart, preset, crf, whole_progress_cb
+        )
+
+    output_path = os.path.abspath(output_path)
+    ext = os.path.splitext(video_path)[1] or ".mp4"
+    # Chunks are as big as the video: keep them on the output's disk rather than in /tmp
+    with tempfile.TemporaryDirectory(prefix="polysub-split-", dir=os.path.dirname(output_path)) as work_dir:
+        chunks = _split_at_keyframes(video_path, duration, n_chunks, work_dir, ext)
+        if len(chunks) < 2:
+            print("⚠️ Could not split the video, burning it in one piece.")
+            return burn_subtitles(
+                video_path, vtt_path, output_path, target_language, subtitle_color, hwaccel, True,
+                keep_streams, faststart, preset, crf, whole_progress_cb
+            )
+
+        hw = select_hwaccel(hwaccel)
+        if not hw and preset is None:
+            preset = _x264_preset(video_path) # From the whole video: a short chunk would get a slower preset
+        cues = _read_cues(vtt_path)
+        jobs = []
+        for i, (chunk_path, chunk_start, chunk_end) in enumerate(chunks):
+            chunk_vtt = os.path.join(work_dir, f"chunk_{i:03d}.vtt")
+            _write_vtt_slice(cues, chunk_start, chunk_end, chunk_vtt)
+            jobs.append({
+                "video_path": chunk_path, "vtt_path": chunk_vtt,
+                "output_path": os.path.join(work_dir, f"burned_{i:03d}{ext}"),
+                "target_language": target_language, "subtitle_color": subtitle_color, "hwaccel": hw or "none",
+                "cache": False, # Temporary chunks: caching them would only fill the disk
+                "copy_if_empty": False, # A stream-copied chunk couldn't be concatenated with encoded ones
+                "fallback": False, "gpu_overlay": False, # Same encoder and settings for every chunk
+                "keep_streams": keep_streams, "faststart": False, # Only the joined output needs the index up front
+                "preset": preset, "crf": crf,
+            })
+
+        max_concurrent = min(len(jobs), PARALLEL_MAX_HW_CHUNKS) if hw else len(jobs)
+        burned = burn_subtitles_batch(jobs, max_concurrent=max_concurrent, progress_cb=progress_cb)
+        if not all(burned):
+            print("⚠️ Some chunks failed, burning the video in one piece.")
+            return burn_subtitles(
+                video_path, vtt_path, output_path, target_language, subtitle_color, hwaccel, True,
+                keep_streams, faststart, preset, crf, whole_progress_cb
+            )
+
+        list_path = os.path.join(work_dir, "concat.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in burned:
+                f.write("file '" + path.replace("'", "'\\''") + "'\n")
+        ok, error_msg = _run_ffmpeg([
+            "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-map", "0", "-c", "copy",
+            *_faststart_args(output_path, faststart), output_path
+        ])
+    if ok:
+        print(f"✅ Subtitles burned successfully ({len(chunks)} chunks in parallel).")
+        return output_path
+    print(f"❌ Error joining burned chunks: {error_msg}")
+    return None
+
+def _probe_keyframes(video_path):
+    """
+    Timestamps (seconds) of the video keyframes. Only keyframes are decoded (-skip_frame nokey).
+    """
+    try:
+        result = subprocess.run(
+            [_which("ffprobe"), "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+             "-show_entries", "frame=best_effort_timestamp_time", "-of", "csv=p=0", video_path],
+            capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    keyframes = []
+    for line in result.stdout.split():
+        try:
+            keyframes.append(float(line.strip(",")))
+        except ValueError:
+            continue
+    return sorted(keyframes)
+
+def _split_at_keyframes(video_path, duration, n_chunks, work_dir, ext):
+    """
+    Cuts the video (stream copy) at the keyframes nearest to n_chunks equal parts.
+    Returns [(chunk_path, start, end)] with the actual chunk times, or [] on failure.
+    """
+    keyframes = [t for t in _probe_keyframes(video_path) if 0 < t < duration]
+    if not keyframes:
+        return []
+    cut_points = sorted({min(keyframes, key=lambda t: abs(t - duration * i / n_chunks)) for i in range(1, n_chunks)})
+
+    list_path = os.path.join(work_dir, "segments.csv")
+    ok, error_msg = _run_ffmpeg([
+        "ffmpeg", "-y", "-i", os.path.abspath(video_path), "-map", "0", "-c", "copy",
+        "-f", "segment", "-reset_timestamps", "1",
+        # The muxer cuts at the first keyframe at or after each time: aim just before the chosen keyframe
+        "-segment_times", ",".join(f"{max(t - 0.001, 0):.3f}" for t in cut_points),
+        "-segment_list", list_path, "-segment_list_type", "csv",
+        os.path.join(work_dir, "chunk_%03d" + ext)
+    ])
+    if not ok:
+        print(f"⚠️ Splitting failed: {error_msg[-500:]}")
+        return []
+
+    # segments.csv lines: chunk_000.mp4,0.000000,12.345678
+    chunks = []
+    with open(list_path, encoding="utf-8") as f:
+        for line in f:
+            name, start, end = line.strip().rsplit(",", 2)
+            chunks.append((os.path.join(work_dir, name), float(start), float(end)))
+    return chunks
+
+def _write_vtt_slice(cues, start, end, path):
+    """
+    Writes the cues overlapping [start, end) to path, shifted so the chunk starts at 0 (always a valid file).
+    """
+    parts = ["WEBVTT\n"]
+    for cue_start, cue_end, settings, lines in cues:
+        if not lines or cue_end <= start or cue_start >= end:
+            continue
+        timing = f"{_vtt_timestamp(max(cue_start, start) - start)} --> {_vtt_timestamp(min(cue_end, end) - start)} {settings}"
+        parts.append(timing.rstrip() + "\n" + "\n".join(lines) + "\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))